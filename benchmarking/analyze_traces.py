@@ -0,0 +1,180 @@
+""" Análisis offline de las trazas que escribe scheduler.py con --trace-export.
+
+    Lee los ficheros JSONL (o .jsonl.gz) y muestra, con NumPy:
+      - p50/p90/p99/max de cada fase del ciclo de vida del pod
+      - throughput de binds por intervalo de tiempo
+      - desglose por nodo
+
+    Uso:
+        python analyze_traces.py traces/                      # todos los ficheros del directorio
+        python analyze_traces.py traces/trace-*.jsonl.gz --interval 5 --json
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+from array import array
+
+import numpy as np
+
+EVENTS = ("created", "added", "scheduled", "bound", "started")
+
+# fase -> (evento inicial, evento final)
+PHASES = {
+    "schedule": ("added", "scheduled"),   # espera en cola + decisión
+    "bind": ("scheduled", "bound"),       # llamada(s) al API de binding
+    "e2e": ("added", "bound"),            # lo mismo que las líneas [LATENCY]
+    "start": ("bound", "started"),        # arranque de los contenedores en el nodo
+}
+PERCENTILES = (50, 90, 99)
+
+
+def trace_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl")) +
+                                glob.glob(os.path.join(path, "*.jsonl.gz"))))
+        else:
+            files.extend(sorted(glob.glob(path)))
+    return files
+
+
+def open_trace(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def load(files):
+    """ Devuelve una matriz pods x eventos (NaN si falta el evento), el índice de nodo de cada
+        pod (-1 si no se conoce) y los nombres de los nodos. Se va guardando en arrays
+        compactos en lugar de un dict por pod para que escale a millones de líneas.
+    """
+    pod_index, node_index = {}, {}
+    pods, columns, stamps = array("l"), array("b"), array("d")
+    node_of = {}
+    event_column = {name: i for i, name in enumerate(EVENTS)}
+
+    for path in files:
+        with open_trace(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    column = event_column[entry["event"]]
+                except (ValueError, KeyError):
+                    continue
+                idx = pod_index.setdefault(entry["pod"], len(pod_index))
+                pods.append(idx)
+                columns.append(column)
+                stamps.append(entry["ts"])
+                node = entry.get("node")
+                if node:
+                    node_of[idx] = node_index.setdefault(node, len(node_index))
+
+    matrix = np.full((len(pod_index), len(EVENTS)), np.nan)
+    # Si un evento se repite (p. ej. el pod se recrea con el mismo nombre) gana el último
+    matrix[np.asarray(pods), np.asarray(columns)] = np.asarray(stamps)
+    nodes = np.full(len(pod_index), -1, dtype=np.int64)
+    if node_of:
+        nodes[np.fromiter(node_of.keys(), dtype=np.int64)] = np.fromiter(node_of.values(), dtype=np.int64)
+    node_names = sorted(node_index, key=node_index.get)
+    return matrix, nodes, node_names
+
+
+def phase_durations(matrix, phase):
+    start, end = PHASES[phase]
+    return matrix[:, EVENTS.index(end)] - matrix[:, EVENTS.index(start)]
+
+
+def summarize(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"count": 0}
+    summary = {"count": int(len(values))}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(v)
+    summary["max"] = float(values.max())
+    return summary
+
+
+def throughput(matrix, interval):
+    bound = matrix[:, EVENTS.index("bound")]
+    bound = bound[~np.isnan(bound)]
+    if not len(bound):
+        return []
+    origin = bound.min()
+    edges = np.arange(origin, bound.max() + interval, interval)
+    if len(edges) < 2:
+        edges = np.array([origin, origin + interval])
+    counts, edges = np.histogram(bound, bins=edges)
+    return [{"t": float(t - origin), "bound": int(c), "pods_per_s": float(c / interval)}
+            for t, c in zip(edges[:-1], counts)]
+
+
+def per_node(matrix, nodes, node_names):
+    e2e = phase_durations(matrix, "e2e")
+    out = {}
+    for idx, name in enumerate(node_names):
+        summary = summarize(e2e[nodes == idx])
+        summary["pods"] = int((nodes == idx).sum())
+        out[name] = summary
+    return out
+
+
+def analyze(files, interval):
+    matrix, nodes, node_names = load(files)
+    return {
+        "files": len(files),
+        "pods": int(matrix.shape[0]),
+        "phases": {phase: summarize(phase_durations(matrix, phase)) for phase in PHASES},
+        "throughput": throughput(matrix, interval),
+        "nodes": per_node(matrix, nodes, node_names),
+    }
+
+
+def fmt(summary, key):
+    return f"{summary[key]:.3f}" if key in summary else "-"
+
+
+def print_report(report, interval):
+    print(f"Ficheros: {report['files']}  Pods: {report['pods']}")
+    print()
+    print(f"{'fase':<10}{'n':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}   (s)")
+    for phase, summary in report["phases"].items():
+        print(f"{phase:<10}{summary['count']:>9}" +
+              "".join(f"{fmt(summary, k):>10}" for k in ("p50", "p90", "p99", "max")))
+    print()
+    print(f"Throughput (binds cada {interval:g}s)")
+    for bucket in report["throughput"]:
+        print(f"  t+{bucket['t']:>8.1f}s {bucket['bound']:>8} {bucket['pods_per_s']:>10.2f} pods/s")
+    print()
+    print(f"{'nodo':<30}{'pods':>8}{'e2e p50':>10}{'e2e p99':>10}")
+    for name, summary in sorted(report["nodes"].items()):
+        print(f"{name:<30}{summary['pods']:>8}{fmt(summary, 'p50'):>10}{fmt(summary, 'p99'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencias y throughput a partir de las trazas JSONL del scheduler")
+    parser.add_argument("paths", nargs="+", help="ficheros, globs o directorios con trazas")
+    parser.add_argument("--interval", type=float, default=10.0, help="segundos por intervalo de throughput")
+    parser.add_argument("--json", action="store_true", help="salida en JSON en lugar de tablas")
+    args = parser.parse_args()
+
+    files = trace_files(args.paths)
+    if not files:
+        print(f"[ERROR] No hay ficheros de trazas en {' '.join(args.paths)}", file=sys.stderr)
+        sys.exit(1)
+
+    report = analyze(files, args.interval)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report, args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,647 @@
+""" API server de mentira para medir scheduler.py a escala sin kind ni Docker.
+
+    Sirve por HTTP lo que usa el scheduler:
+      - LIST y WATCH de nodos y pods (con fieldSelector, resourceVersion, bookmarks y 410 Gone)
+      - POST .../bindings (o .../pods/<pod>/binding) y PATCH de pods
+      - Leases de coordination.k8s.io (elección de líder y sharding)
+
+    y simula un clúster: N nodos con allocatable y taints, M pods que se van creando a un
+    ritmo dado, un "kubelet" que pasa a Running los pods asignados y, opcionalmente, los borra
+    pasado un tiempo. Se puede añadir latencia a cada petición y errores en los binds.
+
+    Uso:
+        python fake_apiserver.py --nodes 5000 --pods 50000 --create-rate 2000 --kubeconfig-out /tmp/fake.kubeconfig
+        python ../scheduler.py --kubeconfig /tmp/fake.kubeconfig --engine async --batch-size 64
+
+    GET /stats devuelve el progreso en JSON; al terminar de asignar todos los pods se imprime
+    el throughput y la latencia creación -> bind.
+"""
+import argparse
+import collections
+import datetime
+import heapq
+import json
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# -------------------------
+# Estado del clúster simulado
+# -------------------------
+HISTORY = 200000        # eventos que se guardan para reanudar watches; más antiguos -> 410 Gone
+
+
+def now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def now_micro():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def get_field(obj, path):
+    value = obj
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value if value is not None else ""
+
+
+def parse_selector(selector):
+    """ "a=b,c!=d" -> [(ruta, operador, valor)]. Sirve para fieldSelector y labelSelector. """
+    terms = []
+    for term in (selector or "").split(","):
+        if not term:
+            continue
+        match = re.match(r"([^!=]+)(!=|==|=)(.*)", term)
+        if match:
+            key, op, value = match.groups()
+            terms.append((key, "!=" if op == "!=" else "=", value))
+    return terms
+
+
+def matches(obj, fields, labels=()):
+    for path, op, value in fields:
+        if (str(get_field(obj, path)) == value) != (op == "="):
+            return False
+    obj_labels = obj["metadata"].get("labels") or {}
+    for key, op, value in labels:
+        if (obj_labels.get(key) == value) != (op == "="):
+            return False
+    return True
+
+
+def merge(target, patch):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        elif value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+
+
+class Event:
+    __slots__ = ("rv", "type", "obj", "old", "data")
+
+    def __init__(self, rv, event_type, obj, old):
+        self.rv = rv
+        self.type = event_type
+        self.obj = obj
+        self.old = old      # objeto anterior, para traducir eventos en watches con fieldSelector
+        self.data = None    # JSON del objeto, se serializa una vez para todos los watches
+
+    def encoded(self):
+        if self.data is None:
+            self.data = json.dumps(self.obj, separators=(",", ":")).encode()
+        return self.data
+
+
+class Cluster:
+    def __init__(self, args):
+        self.args = args
+        self.cond = threading.Condition()
+        self.rv = 0
+        self.objects = {"nodes": {}, "pods": {}, "leases": {}}
+        self.events = {"nodes": collections.deque(maxlen=HISTORY), "pods": collections.deque(maxlen=HISTORY)}
+        self.kubelet_heap = []
+        self.stats = collections.Counter()
+        self.created_at = {}        # ns/nombre -> instante de creación (monotonic)
+        self.bind_latency = []
+        self.first_created = None
+        self.last_bound = None
+        self.finished = False
+
+    # --- almacenamiento ---
+    def _store(self, kind, key, obj, event_type):
+        """ Guarda (o borra) el objeto con un resourceVersion nuevo y emite el evento. """
+        self.rv += 1
+        old = self.objects[kind].get(key)
+        if event_type == "DELETED":
+            self.objects[kind].pop(key, None)
+            obj = dict(obj, metadata=dict(obj["metadata"], resourceVersion=str(self.rv)))
+        else:
+            obj["metadata"]["resourceVersion"] = str(self.rv)
+            self.objects[kind][key] = obj
+        if kind in self.events:
+            self.events[kind].append(Event(self.rv, event_type, obj, old))
+            self.cond.notify_all()
+        return obj
+
+    def snapshot(self, kind, fields, labels):
+        with self.cond:
+            items = [o for o in self.objects[kind].values() if matches(o, fields, labels)]
+            return items, self.rv
+
+    def events_since(self, kind, rv):
+        """ Eventos con resourceVersion > rv, o None si ya no están en el histórico (410). """
+        events = self.events[kind]
+        if events and rv < events[0].rv - 1 and len(events) == events.maxlen:
+            return None
+        if not events or events[-1].rv <= rv:
+            return []
+        # Los rv son crecientes: búsqueda binaria sobre el deque
+        lo, hi = 0, len(events)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if events[mid].rv <= rv:
+                lo = mid + 1
+            else:
+                hi = mid
+        return [events[i] for i in range(lo, len(events))]
+
+    # --- simulación ---
+    def populate_nodes(self):
+        args = self.args
+        rnd = random.Random(args.seed)
+        with self.cond:
+            for i in range(args.nodes):
+                name = f"sim-node-{i:05d}"
+                taints = []
+                if rnd.random() < args.taint_fraction:
+                    taints.append({"key": "dedicated", "value": "special", "effect": "NoSchedule"})
+                node = {
+                    "apiVersion": "v1", "kind": "Node",
+                    "metadata": {"name": name, "uid": f"node-{i}", "creationTimestamp": now_iso(),
+                                 "labels": {"env": "prod", "kubernetes.io/hostname": name}},
+                    "spec": {"taints": taints} if taints else {},
+                    "status": {"allocatable": {"cpu": args.node_cpu, "memory": args.node_memory,
+                                               "pods": str(args.node_pods)}},
+                }
+                self._store("nodes", name, node, "ADDED")
+
+    def create_pods(self):
+        args = self.args
+        rnd = random.Random(args.seed + 1)
+        sizes = [("100m", "64Mi"), ("250m", "256Mi"), ("500m", "512Mi"), ("1", "1Gi")]
+        start = time.monotonic()
+        for i in range(args.pods):
+            if not running:
+                return
+            if args.create_rate:
+                delay = start + i / args.create_rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            cpu, mem = rnd.choice(sizes)
+            namespace = f"ns-{i % args.namespaces}"
+            name = f"sim-pod-{i:06d}"
+            pod = {
+                "apiVersion": "v1", "kind": "Pod",
+                "metadata": {"name": name, "namespace": namespace, "uid": f"pod-{i}",
+                             "creationTimestamp": now_iso(), "labels": {"app": f"app-{i % args.apps}"}},
+                "spec": {"schedulerName": args.scheduler_name,
+                         "containers": [{"name": "main", "image": "busybox",
+                                         "resources": {"requests": {"cpu": cpu, "memory": mem}}}]},
+                "status": {"phase": "Pending"},
+            }
+            if rnd.random() < args.toleration_fraction:
+                pod["spec"]["tolerations"] = [{"key": "dedicated", "operator": "Equal", "value": "special",
+                                               "effect": "NoSchedule"}]
+            with self.cond:
+                key = f"{namespace}/{name}"
+                self.created_at[key] = time.monotonic()
+                if self.first_created is None:
+                    self.first_created = self.created_at[key]
+                self.stats["created"] += 1
+                self._store("pods", key, pod, "ADDED")
+
+    def bind(self, namespace, name, node_name):
+        key = f"{namespace}/{name}"
+        with self.cond:
+            pod = self.objects["pods"].get(key)
+            if pod is None:
+                return 404, "NotFound"
+            if pod["spec"].get("nodeName"):
+                self.stats["bind_conflicts"] += 1
+                return 409, "Conflict"
+            if node_name not in self.objects["nodes"]:
+                return 404, "NotFound"
+            pod = json.loads(json.dumps(pod))
+            pod["spec"]["nodeName"] = node_name
+            self._store("pods", key, pod, "MODIFIED")
+            now = time.monotonic()
+            self.stats["bound"] += 1
+            self.last_bound = now
+            created = self.created_at.pop(key, None)
+            if created is not None:
+                self.bind_latency.append(now - created)
+            heapq.heappush(self.kubelet_heap, (now + self.args.kubelet_delay, "run", key))
+            self.cond.notify_all()
+            if self.stats["bound"] == self.args.pods and not self.finished:
+                self.finished = True
+                threading.Thread(target=self.report, name="report", daemon=True).start()
+        return 201, "Created"
+
+    def kubelet(self):
+        """ Pasa a Running los pods asignados y, con --pod-lifetime, los borra después. """
+        while running:
+            with self.cond:
+                now = time.monotonic()
+                while self.kubelet_heap and self.kubelet_heap[0][0] <= now:
+                    _, action, key = heapq.heappop(self.kubelet_heap)
+                    pod = self.objects["pods"].get(key)
+                    if pod is None:
+                        continue
+                    if action == "run":
+                        pod = json.loads(json.dumps(pod))
+                        pod["status"] = {"phase": "Running", "containerStatuses": [
+                            {"name": "main", "ready": True, "restartCount": 0, "image": "busybox", "imageID": "",
+                             "state": {"running": {"startedAt": now_iso()}}}]}
+                        self._store("pods", key, pod, "MODIFIED")
+                        self.stats["running"] += 1
+                        if self.args.pod_lifetime:
+                            heapq.heappush(self.kubelet_heap, (now + self.args.pod_lifetime, "delete", key))
+                    else:
+                        self._store("pods", key, pod, "DELETED")
+                        self.stats["deleted"] += 1
+                wait = self.kubelet_heap[0][0] - now if self.kubelet_heap else 1.0
+                self.cond.wait(timeout=min(max(wait, 0.001), 1.0))
+
+    def summary(self):
+        with self.cond:
+            latencies = sorted(self.bind_latency)
+            out = dict(self.stats)
+            out["nodes"] = len(self.objects["nodes"])
+            out["pods"] = len(self.objects["pods"])
+            if self.first_created is not None and self.last_bound is not None:
+                elapsed = self.last_bound - self.first_created
+                out["elapsed_s"] = round(elapsed, 3)
+                out["binds_per_s"] = round(self.stats["bound"] / elapsed, 1) if elapsed > 0 else None
+            for p in (50, 90, 99):
+                if latencies:
+                    out[f"bind_latency_p{p}_s"] = round(latencies[min(len(latencies) - 1, len(latencies) * p // 100)], 4)
+            if latencies:
+                out["bind_latency_max_s"] = round(latencies[-1], 4)
+            return out
+
+    def report(self):
+        print("[SIM] Todos los pods asignados: " + json.dumps(self.summary()), flush=True)
+
+# -------------------------
+# HTTP
+# -------------------------
+running = True
+CLUSTER = None
+
+POD_PATH = re.compile(r"^/api/v1/namespaces/([^/]+)/pods/([^/]+)(/binding)?$")
+BINDINGS_PATH = re.compile(r"^/api/v1/namespaces/([^/]+)/bindings$")
+LEASES_PATH = re.compile(r"^/apis/coordination\.k8s\.io/v1/namespaces/([^/]+)/leases(?:/([^/]+))?$")
+
+
+def status_body(code, reason, message=""):
+    return {"kind": "Status", "apiVersion": "v1", "metadata": {}, "status": "Failure",
+            "message": message or reason, "reason": reason, "code": code}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # --- utilidades ---
+    def send_json(self, code, body):
+        data = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_status(self, code, reason, message=""):
+        self.send_json(code, status_body(code, reason, message))
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def simulate_latency(self):
+        args = CLUSTER.args
+        if args.latency_ms or args.latency_jitter_ms:
+            time.sleep(max(0.0, args.latency_ms + random.uniform(-1, 1) * args.latency_jitter_ms) / 1000)
+
+    def injected_error(self):
+        args = CLUSTER.args
+        if args.error_rate and random.random() < args.error_rate:
+            CLUSTER.stats["injected_errors"] += 1
+            self.send_status(args.error_code, "InternalError" if args.error_code >= 500 else "TooManyRequests")
+            return True
+        return False
+
+    # --- verbos ---
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.simulate_latency()
+
+        if url.path == "/stats":
+            return self.send_json(200, CLUSTER.summary())
+        if url.path in ("/api/v1/nodes", "/api/v1/pods"):
+            kind = url.path.rsplit("/", 1)[1]
+            if params.get("watch", "").lower() in ("true", "1"):
+                return self.watch(kind, params)
+            return self.list(kind, params)
+
+        match = LEASES_PATH.match(url.path)
+        if match:
+            namespace, name = match.groups()
+            with CLUSTER.cond:
+                if name:
+                    lease = CLUSTER.objects["leases"].get(f"{namespace}/{name}")
+                    if lease is None:
+                        return self.send_status(404, "NotFound")
+                    return self.send_json(200, lease)
+                labels = parse_selector(params.get("labelSelector"))
+                items = [l for k, l in CLUSTER.objects["leases"].items()
+                         if k.startswith(namespace + "/") and matches(l, (), labels)]
+                return self.send_json(200, {"kind": "LeaseList", "apiVersion": "coordination.k8s.io/v1",
+                                            "metadata": {"resourceVersion": str(CLUSTER.rv)}, "items": items})
+        self.send_status(404, "NotFound")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self.simulate_latency()
+        body = self.read_body()
+
+        # create_namespaced_binding usa .../bindings con el pod en metadata.name;
+        # create_namespaced_pod_binding, la subresource .../pods/<pod>/binding
+        match = POD_PATH.match(url.path)
+        bindings = BINDINGS_PATH.match(url.path)
+        if (match and match.group(3)) or bindings:
+            if self.injected_error():
+                return
+            args = CLUSTER.args
+            if args.conflict_rate and random.random() < args.conflict_rate:
+                CLUSTER.stats["injected_conflicts"] += 1
+                return self.send_status(409, "Conflict")
+            if bindings:
+                namespace, name = bindings.group(1), body.get("metadata", {}).get("name")
+            else:
+                namespace, name = match.group(1), match.group(2)
+            code, reason = CLUSTER.bind(namespace, name, body.get("target", {}).get("name"))
+            if code >= 300:
+                return self.send_status(code, reason)
+            return self.send_json(201, {"kind": "Status", "apiVersion": "v1", "metadata": {}, "status": "Success",
+                                        "code": 201})
+
+        match = LEASES_PATH.match(url.path)
+        if match and not match.group(2):
+            namespace = match.group(1)
+            key = f"{namespace}/{body['metadata']['name']}"
+            with CLUSTER.cond:
+                if key in CLUSTER.objects["leases"]:
+                    return self.send_status(409, "AlreadyExists")
+                body["metadata"]["namespace"] = namespace
+                lease = CLUSTER._store("leases", key, body, "ADDED")
+            return self.send_json(201, lease)
+        self.send_status(404, "NotFound")
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        self.simulate_latency()
+        body = self.read_body()
+        match = LEASES_PATH.match(url.path)
+        if not match or not match.group(2):
+            return self.send_status(404, "NotFound")
+        key = f"{match.group(1)}/{match.group(2)}"
+        with CLUSTER.cond:
+            current = CLUSTER.objects["leases"].get(key)
+            if current is None:
+                return self.send_status(404, "NotFound")
+            if body["metadata"].get("resourceVersion") != current["metadata"]["resourceVersion"]:
+                return self.send_status(409, "Conflict", "the object has been modified")
+            lease = CLUSTER._store("leases", key, body, "MODIFIED")
+        self.send_json(200, lease)
+
+    def do_PATCH(self):
+        url = urlparse(self.path)
+        self.simulate_latency()
+        body = self.read_body()
+
+        match = LEASES_PATH.match(url.path)
+        kind, key = None, None
+        if match and match.group(2):
+            kind, key = "leases", f"{match.group(1)}/{match.group(2)}"
+        match = POD_PATH.match(url.path)
+        if match and not match.group(3):
+            if self.injected_error():
+                return
+            kind, key = "pods", f"{match.group(1)}/{match.group(2)}"
+        if kind is None:
+            return self.send_status(404, "NotFound")
+
+        with CLUSTER.cond:
+            current = CLUSTER.objects[kind].get(key)
+            if current is None:
+                return self.send_status(404, "NotFound")
+            obj = json.loads(json.dumps(current))
+            merge(obj, body)
+            obj = CLUSTER._store(kind, key, obj, "MODIFIED")
+        self.send_json(200, obj)
+
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        self.simulate_latency()
+        match = LEASES_PATH.match(url.path)
+        if not match or not match.group(2):
+            return self.send_status(404, "NotFound")
+        key = f"{match.group(1)}/{match.group(2)}"
+        with CLUSTER.cond:
+            lease = CLUSTER.objects["leases"].get(key)
+            if lease is None:
+                return self.send_status(404, "NotFound")
+            CLUSTER._store("leases", key, lease, "DELETED")
+        self.send_json(200, {"kind": "Status", "apiVersion": "v1", "status": "Success"})
+
+    # --- LIST / WATCH ---
+    def list(self, kind, params):
+        fields = parse_selector(params.get("fieldSelector"))
+        labels = parse_selector(params.get("labelSelector"))
+        items, rv = CLUSTER.snapshot(kind, fields, labels)
+        self.send_json(200, {"kind": "PodList" if kind == "pods" else "NodeList", "apiVersion": "v1",
+                             "metadata": {"resourceVersion": str(rv)}, "items": items})
+
+    def watch(self, kind, params):
+        fields = parse_selector(params.get("fieldSelector"))
+        labels = parse_selector(params.get("labelSelector"))
+        bookmarks = params.get("allowWatchBookmarks", "").lower() in ("true", "1")
+        timeout = float(params.get("timeoutSeconds") or 300)
+        rv = int(params.get("resourceVersion") or 0)
+        deadline = time.monotonic() + timeout
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        CLUSTER.stats["watches"] += 1
+
+        try:
+            if not rv:
+                # Sin resourceVersion un watch empieza con el estado actual como ADDED
+                items, rv = CLUSTER.snapshot(kind, fields, labels)
+                self.write_lines([self.line("ADDED", json.dumps(o, separators=(",", ":")).encode()) for o in items])
+
+            last_bookmark = time.monotonic()
+            while running and time.monotonic() < deadline:
+                with CLUSTER.cond:
+                    events = CLUSTER.events_since(kind, rv)
+                    if events == []:
+                        CLUSTER.cond.wait(timeout=min(1.0, max(deadline - time.monotonic(), 0.0)))
+                        events = CLUSTER.events_since(kind, rv)
+                    current_rv = CLUSTER.rv
+                if events is None:
+                    gone = status_body(410, "Expired", f"too old resource version: {rv}")
+                    self.write_lines([self.line("ERROR", json.dumps(gone).encode())])
+                    break
+
+                lines = []
+                for event in events:
+                    rv = event.rv
+                    event_type = self.translate(event, fields, labels)
+                    if event_type:
+                        lines.append(self.line(event_type, event.encoded()))
+                if lines:
+                    self.write_lines(lines)
+                elif bookmarks and time.monotonic() - last_bookmark > 1.0:
+                    rv = max(rv, current_rv)
+                    bookmark = {"kind": "Pod" if kind == "pods" else "Node", "apiVersion": "v1",
+                                "metadata": {"resourceVersion": str(rv)}}
+                    self.write_lines([self.line("BOOKMARK", json.dumps(bookmark).encode())])
+                    last_bookmark = time.monotonic()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    @staticmethod
+    def translate(event, fields, labels):
+        """ Como el API server real: con selector, un objeto que deja de cumplirlo llega como
+            DELETED y uno que empieza a cumplirlo, como ADDED.
+        """
+        if not fields and not labels:
+            return event.type
+        now = event.type != "DELETED" and matches(event.obj, fields, labels)
+        before = event.old is not None and matches(event.old, fields, labels)
+        if event.type == "DELETED":
+            return "DELETED" if before else None
+        if now and before:
+            return "MODIFIED"
+        if now:
+            return "ADDED"
+        if before:
+            return "DELETED"
+        return None
+
+    @staticmethod
+    def line(event_type, data):
+        return b'{"type":"' + event_type.encode() + b'","object":' + data + b"}\n"
+
+    def write_lines(self, lines):
+        payload = b"".join(lines)
+        if payload:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cierra conexiones del pool sin avisar; no es un error del simulador
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+# -------------------------
+# Arranque
+# -------------------------
+def progress(interval):
+    """ Una línea [SIM] por intervalo con lo creado/asignado y el ritmo de binds. """
+    last = 0
+    while running:
+        time.sleep(interval)
+        bound = CLUSTER.stats["bound"]
+        print(f"[SIM] creados={CLUSTER.stats['created']} asignados={bound} "
+              f"running={CLUSTER.stats['running']} binds/s={(bound - last) / interval:.1f}", flush=True)
+        last = bound
+
+
+def write_kubeconfig(path, port):
+    # JSON es YAML válido; load_kube_config lo lee tal cual
+    kubeconfig = {
+        "apiVersion": "v1", "kind": "Config", "current-context": "fake",
+        "clusters": [{"name": "fake", "cluster": {"server": f"http://127.0.0.1:{port}"}}],
+        "users": [{"name": "fake", "user": {"token": "fake"}}],
+        "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+    }
+    with open(path, "w") as f:
+        json.dump(kubeconfig, f, indent=2)
+    print(f"[SIM] kubeconfig en {path}", flush=True)
+
+
+def main():
+    global CLUSTER, HISTORY
+
+    parser = argparse.ArgumentParser(description="API server simulado para benchmarks de scheduler.py")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--kubeconfig-out", default=None, help="escribe un kubeconfig que apunta a este servidor")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--node-cpu", default="32")
+    parser.add_argument("--node-memory", default="128Gi")
+    parser.add_argument("--node-pods", type=int, default=110)
+    parser.add_argument("--taint-fraction", type=float, default=0.0, help="fracción de nodos con taint dedicated=special")
+    parser.add_argument("--pods", type=int, default=10000)
+    parser.add_argument("--create-rate", type=float, default=0, help="pods/s que se crean (0 = todos al arrancar)")
+    parser.add_argument("--start-delay", type=float, default=0, help="segundos antes de empezar a crear pods")
+    parser.add_argument("--namespaces", type=int, default=10)
+    parser.add_argument("--apps", type=int, default=50)
+    parser.add_argument("--toleration-fraction", type=float, default=0.0)
+    parser.add_argument("--scheduler-name", default="my-scheduler")
+    parser.add_argument("--kubelet-delay", type=float, default=0.5, help="segundos entre el bind y Running")
+    parser.add_argument("--pod-lifetime", type=float, default=0, help="segundos en Running antes de borrar el pod (0 = nunca)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latencia añadida a cada petición")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fracción de binds/patches que fallan")
+    parser.add_argument("--error-code", type=int, default=500)
+    parser.add_argument("--conflict-rate", type=float, default=0, help="fracción de binds que devuelven 409")
+    parser.add_argument("--history", type=int, default=HISTORY, help="eventos guardados para reanudar watches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="segundos entre líneas de progreso (0 = ninguna)")
+    args = parser.parse_args()
+
+    HISTORY = args.history
+    CLUSTER = Cluster(args)
+    CLUSTER.populate_nodes()
+
+    server = Server(("127.0.0.1", args.port), Handler)
+    port = server.server_address[1]
+    print(f"[SIM] API server en http://127.0.0.1:{port}: {args.nodes} nodos, {args.pods} pods", flush=True)
+    if args.kubeconfig_out:
+        write_kubeconfig(args.kubeconfig_out, port)
+
+    def stop(sig, frame):
+        global running
+        running = False
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    threading.Thread(target=CLUSTER.kubelet, name="kubelet", daemon=True).start()
+    if args.progress_interval:
+        threading.Thread(target=progress, args=(args.progress_interval,), name="progress", daemon=True).start()
+
+    def creator():
+        time.sleep(args.start_delay)
+        CLUSTER.create_pods()
+
+    threading.Thread(target=creator, name="creator", daemon=True).start()
+    server.serve_forever()
+    print("[SIM] " + json.dumps(CLUSTER.summary()), flush=True)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+""" Microbenchmarks de las funciones calientes de scheduler.py con pods y nodos sintéticos.
+
+    Mide el tiempo por llamada (mejor ronda y mediana, con el GC parado como timeit) y la
+    memoria (bytes que quedan retenidos por llamada y pico por ronda, con tracemalloc) de:
+      - is_node_compatible       un pod contra todos los nodos; "cold" vacía antes la memoización
+      - choose_node              decisión completa con los plugins de --plugins/--strategy
+      - record_trace             CREATED/ADDED/SCHEDULED/BOUND de pods nuevos
+      - pod_recent_rejection     con y sin anotación de rechazo
+      - binding_body             construcción del V1Binding
+      - bind_pod                 un intento de bind contra un API nulo (métricas y traza incluidas)
+
+    Los dos primeros se repiten para cada combinación de --nodes, --taints (taints por nodo,
+    en la mitad de los nodos) y --tolerations (tolerations por pod).
+
+    Uso:
+        python microbench.py                                   # 10/100/1000/10000 nodos
+        python microbench.py --nodes 1000,10000 --output actual.json
+        python microbench.py --compare base.json --output actual.json   # sale con 1 si hay regresiones
+"""
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import scheduler as S  # noqa: E402
+from kubernetes import client  # noqa: E402
+
+# -------------------------
+# Datos sintéticos
+# -------------------------
+SIZES = [("100m", "64Mi"), ("250m", "256Mi"), ("500m", "512Mi"), ("1", "1Gi")]
+
+
+def node_dict(i, taints):
+    name = f"bench-node-{i:05d}"
+    spec = {}
+    if taints and i % 2 == 0:
+        spec["taints"] = [{"key": f"key-{j}", "value": f"v{i // 2 % 2}", "effect": "NoSchedule"}
+                          for j in range(taints)]
+    return {
+        "metadata": {"name": name, "uid": name, "resourceVersion": "1",
+                     "labels": {"env": "prod" if i % 10 else "dev", "kubernetes.io/hostname": name}},
+        "spec": spec,
+        "status": {"allocatable": {"cpu": "32", "memory": "128Gi", "pods": "110"}},
+    }
+
+
+def pod_dict(i, tolerations, node_name=None, rejected=None):
+    cpu, mem = SIZES[i % len(SIZES)]
+    annotations = {S.REJECTION_LABEL: rejected} if rejected else None
+    spec = {"schedulerName": "my-scheduler",
+            "containers": [{"name": "main", "resources": {"requests": {"cpu": cpu, "memory": mem}}}]}
+    if tolerations:
+        spec["tolerations"] = [{"key": f"key-{j}", "operator": "Equal", "value": "v0", "effect": "NoSchedule"}
+                               for j in range(tolerations)]
+    if node_name:
+        spec["nodeName"] = node_name
+    return {
+        "metadata": {"name": f"bench-pod-{i:06d}", "namespace": f"ns-{i % 4}", "uid": f"bench-pod-{i}",
+                     "resourceVersion": "1", "labels": {"app": f"app-{i % 10}"}, "annotations": annotations,
+                     "creationTimestamp": "2024-01-01T00:00:00Z"},
+        "spec": spec,
+        "status": {"phase": "Running" if node_name else "Pending"},
+    }
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class Factory:
+    """ dict -> objeto con el que trabaja el scheduler: registro ligero (--decode raw) o
+        modelo V1 del cliente (--decode typed).
+    """
+
+    def __init__(self, objects):
+        self.typed = objects == "typed"
+        self.api_client = client.ApiClient()
+
+    def node(self, d):
+        if self.typed:
+            return self.api_client.deserialize(_Response(json.dumps(d)), "V1Node")
+        return S.NodeRecord(d)
+
+    def pod(self, d):
+        if self.typed:
+            return self.api_client.deserialize(_Response(json.dumps(d)), "V1Pod")
+        return S.PodRecord(d)
+
+
+class NullApi:
+    def create_namespaced_binding(self, namespace, body, **kwargs):
+        return None
+
+# -------------------------
+# Medición
+# -------------------------
+def measure(run, calls, min_time, min_rounds):
+    """ run() hace `calls` llamadas. Devuelve ns por llamada (mejor ronda y mediana), rondas,
+        bytes retenidos por llamada y pico de memoria de una ronda.
+    """
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + min_time
+        while len(times) < min_rounds or time.perf_counter() < deadline:
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    # La memoria en una ronda aparte: tracemalloc multiplica el tiempo de cada asignación
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    run()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_call = [t / calls * 1e9 for t in times]
+    return {
+        "calls": calls,
+        "rounds": len(times),
+        "ns_best": min(per_call),
+        "ns_median": statistics.median(per_call),
+        "retained_bytes_per_call": max(after - before, 0) / calls,
+        "peak_kib": (peak - before) / 1024,
+    }
+
+# -------------------------
+# Benchmarks
+# -------------------------
+def bench_compatibility(factory, nodes, taints, tolerations, cold):
+    node_objs = [factory.node(node_dict(i, taints)) for i in range(nodes)]
+    pod = factory.pod(pod_dict(0, tolerations))
+
+    def run():
+        if cold:
+            S.filter_reason.cache_clear()
+            S.NODE_FILTERS.clear()
+        for node in node_objs:
+            S.is_node_compatible(node, pod)
+
+    return run, len(node_objs)
+
+
+def bench_choose_node(factory, nodes, taints, tolerations, pods=256):
+    node_objs = [factory.node(node_dict(i, taints)) for i in range(nodes)]
+    # Un tercio de los nodos ya tiene pods, para que la carga no sea todo ceros
+    running = [factory.pod(pod_dict(100000 + i, 0, node_name=node_objs[i % len(node_objs)].metadata.name))
+               for i in range(len(node_objs) // 3)]
+    cache = S.ClusterCache(None)
+    cache.reset(node_objs, running)
+    pending = [factory.pod(pod_dict(i, tolerations)) for i in range(pods)]
+
+    def run():
+        for pod in pending:
+            S.choose_node(cache, pod)
+
+    return run, len(pending)
+
+
+def bench_record_trace(factory, pods=2000):
+    pending = [factory.pod(pod_dict(i, 0)) for i in range(pods)]
+
+    def run():
+        # Almacén nuevo en cada ronda: se mide crear el registro, no encontrarlo
+        S.TRACES = S.TraceStore()
+        for pod in pending:
+            S.record_trace(pod, "CREATED")
+            S.record_trace(pod, "ADDED")
+            S.record_trace(pod, "SCHEDULED", node="bench-node-00001")
+            S.record_trace(pod, "BOUND", node="bench-node-00001")
+
+    return run, 4 * len(pending)
+
+
+def bench_recent_rejection(factory, rejected, pods=2000):
+    stamp = datetime.datetime.utcnow().isoformat() if rejected else None
+    objs = [factory.pod(pod_dict(i, 0, rejected=stamp)) for i in range(pods)]
+    # Devuelve el instante del rechazo o None: se comprueba que el caso mide lo que dice
+    if (S.pod_recent_rejection(objs[0]) is not None) != rejected:
+        raise RuntimeError("pod_recent_rejection no devuelve lo esperado para el caso")
+
+    def run():
+        for pod in objs:
+            S.pod_recent_rejection(pod)
+
+    return run, len(objs)
+
+
+def bench_binding_body(factory, pods=2000):
+    objs = [factory.pod(pod_dict(i, 0)) for i in range(pods)]
+
+    def run():
+        for pod in objs:
+            S.binding_body(pod, "bench-node-00001")
+
+    return run, len(objs)
+
+
+def bench_bind_pod(factory, pods=2000):
+    objs = [factory.pod(pod_dict(i, 0)) for i in range(pods)]
+    api = NullApi()
+
+    def run():
+        for pod in objs:
+            S.bind_pod(api, pod, "bench-node-00001")
+
+    return run, len(objs)
+
+
+def cases(args):
+    """ (nombre, parámetros, función que prepara el benchmark) """
+    for nodes in args.nodes:
+        for taints in args.taints:
+            for tolerations in args.tolerations:
+                params = {"nodes": nodes, "taints": taints, "tolerations": tolerations}
+                yield "is_node_compatible.cold", params, lambda f, p=params: bench_compatibility(f, **p, cold=True)
+                yield "is_node_compatible.warm", params, lambda f, p=params: bench_compatibility(f, **p, cold=False)
+                yield "choose_node", params, lambda f, p=params: bench_choose_node(f, **p)
+    yield "record_trace", {}, bench_record_trace
+    yield "pod_recent_rejection.none", {}, lambda f: bench_recent_rejection(f, rejected=False)
+    yield "pod_recent_rejection.annotated", {}, lambda f: bench_recent_rejection(f, rejected=True)
+    yield "binding_body", {}, bench_binding_body
+    yield "bind_pod", {}, bench_bind_pod
+
+
+def case_key(result):
+    return (result["bench"], result.get("nodes"), result.get("taints"), result.get("tolerations"))
+
+
+def compare(results, baseline_path, threshold):
+    """ Cociente ns_best actual / base por caso. Devuelve los casos por encima del umbral. """
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get(case_key(result))
+        if not base:
+            continue
+        result["baseline_ns_best"] = base["ns_best"]
+        result["ratio"] = result["ns_best"] / base["ns_best"]
+        if result["ratio"] > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de las funciones calientes del scheduler")
+    parser.add_argument("--nodes", type=int_list, default=[10, 100, 1000, 10000])
+    parser.add_argument("--taints", type=int_list, default=[0, 2, 8], help="taints por nodo tainted")
+    parser.add_argument("--tolerations", type=int_list, default=[0, 2, 8], help="tolerations por pod")
+    parser.add_argument("--decode", choices=("raw", "typed"), default="raw",
+                        help="objetos como los de scheduler.py --decode raw (registros) o typed (modelos V1)")
+    parser.add_argument("--plugins", default=None, help="igual que en scheduler.py")
+    parser.add_argument("--strategy", choices=sorted(S.STRATEGIES), default="pods")
+    parser.add_argument("--only", default=None, help="sólo los benchmarks cuyo nombre empieza así")
+    parser.add_argument("--min-time", type=float, default=0.2, help="segundos mínimos por benchmark")
+    parser.add_argument("--min-rounds", type=int, default=3)
+    parser.add_argument("--output", default=None, metavar="FILE", help="resultados en JSON")
+    parser.add_argument("--compare", default=None, metavar="FILE", help="JSON de una ejecución anterior")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="con --compare, cociente de tiempo a partir del que se considera regresión")
+    parser.add_argument("--log-level", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="nivel del log del scheduler; las líneas se descartan pero su coste se mide")
+    args = parser.parse_args()
+
+    try:
+        S.PROFILE = S.Profile.parse(args.plugins or S.STRATEGIES[args.strategy])
+    except ValueError as e:
+        parser.error(str(e))
+    S.log.handlers[:] = [logging.NullHandler()]
+    S.log.setLevel(args.log_level)
+    S.log.propagate = False
+    factory = Factory(args.decode)
+
+    print(f"{'benchmark':<34}{'nodos':>7}{'taints':>7}{'tols':>6}{'ns/llamada':>13}{'mediana':>11}"
+          f"{'B ret./ll.':>12}{'pico KiB':>10}")
+    results = []
+    for name, params, prepare in cases(args):
+        if args.only and not name.startswith(args.only):
+            continue
+        run, calls = prepare(factory)
+        result = {"bench": name, **params, **measure(run, calls, args.min_time, args.min_rounds)}
+        results.append(result)
+        print(f"{name:<34}{params.get('nodes', ''):>7}{params.get('taints', ''):>7}"
+              f"{params.get('tolerations', ''):>6}{result['ns_best']:>13,.0f}{result['ns_median']:>11,.0f}"
+              f"{result['retained_bytes_per_call']:>12,.1f}{result['peak_kib']:>10,.1f}", flush=True)
+
+    regressions = []
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        print()
+        if regressions:
+            print(f"[REGRESIÓN] {len(regressions)} casos por encima de {args.threshold:g}x respecto a {args.compare}:")
+            for r in regressions:
+                print(f"  {r['bench']} nodos={r.get('nodes', '-')} taints={r.get('taints', '-')} "
+                      f"tols={r.get('tolerations', '-')}: {r['baseline_ns_best']:,.0f} -> {r['ns_best']:,.0f} ns "
+                      f"({r['ratio']:.2f}x)")
+        else:
+            print(f"Sin regresiones respecto a {args.compare} (umbral {args.threshold:g}x)")
+
+    if args.output:
+        meta = {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "decode": args.decode,
+            "plugins": S.PROFILE.describe(),
+        }
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
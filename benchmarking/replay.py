@@ -0,0 +1,270 @@
+""" Reproduce una grabación de scheduler.py --record para comparar cambios de política o de
+    rendimiento con exactamente la misma carga.
+
+    Los eventos grabados (LIST inicial, nodos y pods) se pasan en orden por la caché, la cola
+    y pick_nodes de scheduler.py. Después de cada evento se vacía la cola, así que las
+    decisiones no dependen de cómo se intercalen los hilos y dos ejecuciones con la misma
+    política eligen los mismos nodos. Los binds no llegan a ningún API server: se responde
+    con el código grabado para ese pod e intento (201 si no se grabó) y los eventos
+    posteriores del pod llevan el nodo elegido en la reproducción, no el de la grabación.
+
+    Uso:
+        python ../scheduler.py --record /tmp/carga.jsonl.gz ...
+        python replay.py /tmp/carga.jsonl.gz                                 # lo más rápido posible
+        python replay.py /tmp/carga.jsonl.gz --speed 1                       # a velocidad real
+        python replay.py /tmp/carga.jsonl.gz --strategy most-allocated --decisions b.json --json
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import scheduler as S  # noqa: E402
+from kubernetes import client  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+
+
+def read_entries(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Una grabación cortada a medias (scheduler matado) acaba en una línea incompleta
+                return
+
+
+class ReplayApi:
+    """ Sustituye al CoreV1Api en los binds: responde al momento con el código grabado para
+        ese pod e intento. La duración grabada no se reproduce: en la grabación los binds
+        podían ir en paralelo (--engine async) y aquí van de uno en uno.
+    """
+
+    def __init__(self, binds):
+        self.binds = binds          # (ns/pod, intento) -> código HTTP (0 = error de red)
+        self.attempts = {}
+
+    def create_namespaced_binding(self, namespace, body, **kwargs):
+        key = f"{namespace}/{body.metadata.name}"
+        attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+        status = self.binds.get((key, attempt), 201)
+        if status == 201:
+            return None
+        if not status:
+            raise ConnectionError("error de red en la grabación")
+        raise client.rest.ApiException(status=status, reason="grabado")
+
+
+class Replay:
+    def __init__(self, api, scheduler_name, batch_size, realtime):
+        self.api = api
+        self.realtime = realtime
+        self.scheduler_name = scheduler_name
+        self.batch_size = batch_size
+        self.cache = S.ClusterCache(api)
+        self.queue = S.SchedulingQueue()
+        self.cache.add_node_listener(self.queue.on_node_change)
+        self.decided = {}           # ns/pod -> nodo elegido en la reproducción
+        self.added = {}             # ns/pod -> instante (reloj de la reproducción) en que se encoló
+        self.decide = []            # segundos de decisión por pod
+        self.e2e = []               # ADDED -> BOUND a velocidad real (lo más rápido posible es siempre 0)
+        self.results = {}
+        self.events = 0
+
+    def apply(self, entry, now):
+        kind = entry["k"]
+        if kind == "sync":
+            self.cache.reset([S.NodeRecord(n) for n in entry["nodes"]], [S.PodRecord(p) for p in entry["pods"]])
+        elif kind == "node":
+            self.cache.apply_node_event(entry["e"], S.NodeRecord(entry["o"]))
+        elif kind == "pod":
+            obj = entry["o"]
+            meta, spec = obj.get("metadata") or {}, obj.get("spec") or {}
+            key = f"{meta.get('namespace')}/{meta.get('name')}"
+            if spec.get("nodeName") and key in self.decided:
+                spec["nodeName"] = self.decided[key]
+            pending = len(self.queue.active)
+            S.observe_pod_event(self.cache, self.queue, self.scheduler_name, entry["e"], S.PodRecord(obj),
+                                entry.get("c", True))
+            if self.realtime and len(self.queue.active) > pending:
+                self.added.setdefault(key, now)
+        else:
+            return
+        self.events += 1
+
+    def drain(self, now):
+        """ Decide y bindea todo lo que haya en la cola activa. """
+        while True:
+            pods = []
+            while len(pods) < self.batch_size:
+                pod = self.queue.pop(timeout=0)
+                if pod is None:
+                    break
+                pods.append(pod)
+            if not pods:
+                return
+
+            start = time.perf_counter()
+            selected = S.pick_nodes(self.api, self.cache, self.queue, pods)
+            per_pod = (time.perf_counter() - start) / len(pods)
+            self.decide.extend([per_pod] * len(pods))
+
+            for pod, node in selected:
+                attempt = 1
+                while True:
+                    result = S.PROFILE.bind(self.api, pod, node, attempt)
+                    # Sin backoff: en la reproducción el reintento va seguido
+                    if not S.bind_should_retry(pod, result, attempt):
+                        break
+                    attempt += 1
+                S.finish_bind(self.cache, self.queue, pod, node, result)
+                self.results[result] = self.results.get(result, 0) + 1
+                key = S.pod_key(pod)
+                if result == S.BIND_OK:
+                    self.decided[key] = node
+                    if key in self.added:
+                        self.e2e.append(now() - self.added.pop(key))
+
+    def pending(self):
+        stats = self.queue.stats()
+        return stats["active"] + stats["backoff"]
+
+
+def summarize(values, scale=1.0):
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values) * scale
+    summary = {"count": int(len(values))}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(v)
+    summary["max"] = float(values.max())
+    return summary
+
+
+def run(args):
+    entries = list(read_entries(args.recording))
+    meta = next((e for e in entries if e["k"] == "meta"), {})
+    binds = {(e["pod"], e["a"]): e["s"] for e in entries if e["k"] == "bind"}
+    scheduler_name = args.scheduler_name or meta.get("scheduler_name", "my-scheduler")
+
+    api = ReplayApi(binds)
+    replay = Replay(api, scheduler_name, args.batch_size, realtime=args.speed > 0)
+
+    origin = time.monotonic()
+
+    def now():
+        return time.monotonic() - origin
+
+    for entry in entries:
+        if args.speed > 0:
+            delay = entry["t"] / args.speed - now()
+            if delay > 0:
+                time.sleep(delay)
+        replay.apply(entry, now())
+        replay.drain(now)
+
+    # Pods en backoff (bind fallido) al acabar la grabación: se esperan hasta --drain-timeout
+    deadline = time.monotonic() + args.drain_timeout
+    while replay.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+        replay.drain(now)
+    wall = time.monotonic() - origin
+
+    decide_total = float(np.sum(replay.decide)) if replay.decide else 0.0
+    load = np.array([replay.cache.node_load.get(n, 0) for n in replay.cache.nodes] or [0])
+    report = {
+        "recording": args.recording,
+        "plugins": S.PROFILE.describe(),
+        "recorded_plugins": meta.get("plugins"),
+        "events": replay.events,
+        "nodes": len(replay.cache.nodes),
+        "decisions": len(replay.decide),
+        "bound": replay.results.get(S.BIND_OK, 0),
+        "bind_results": replay.results,
+        "queue": replay.queue.stats(),
+        "decide_us": summarize(replay.decide, 1e6),
+        "decisions_per_s": len(replay.decide) / decide_total if decide_total else None,
+        "wall_s": wall,
+        "recording_s": entries[-1]["t"] if entries else 0.0,
+        "e2e_s": summarize(replay.e2e),
+        "pods_per_node": {"max": int(load.max()), "mean": float(load.mean()), "std": float(load.std())},
+    }
+    if args.decisions:
+        with open(args.decisions, "w") as f:
+            json.dump(dict(sorted(replay.decided.items())), f, indent=1)
+    return report
+
+
+def fmt(summary, key):
+    return f"{summary[key]:.3f}" if key in summary else "-"
+
+
+def print_report(report):
+    print(f"Grabación: {report['recording']} ({report['events']} eventos, {report['recording_s']:.1f}s grabados)")
+    print(f"Plugins: {report['plugins']}")
+    if report["recorded_plugins"] and report["recorded_plugins"] != report["plugins"]:
+        print(f"  (grabado con: {report['recorded_plugins']})")
+    print(f"Nodos: {report['nodes']}  Decisiones: {report['decisions']}  Bound: {report['bound']}  "
+          f"Binds: {report['bind_results']}  Cola al acabar: {report['queue']}")
+    print()
+    print(f"{'':<14}{'n':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for name, unit in (("decide_us", "µs"), ("e2e_s", "s")):
+        summary = report[name]
+        if not summary["count"]:
+            continue
+        print(f"{name.split('_')[0] + ' (' + unit + ')':<14}{summary['count']:>9}" +
+              "".join(f"{fmt(summary, k):>10}" for k in ("p50", "p90", "p99", "max")))
+    print()
+    rate = report["decisions_per_s"]
+    print(f"Throughput de decisión: {rate:,.0f} pods/s" if rate else "Throughput de decisión: -")
+    print(f"Tiempo total: {report['wall_s']:.2f}s")
+    spread = report["pods_per_node"]
+    print(f"Pods por nodo: max={spread['max']} media={spread['mean']:.2f} desviación={spread['std']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una grabación de scheduler.py --record")
+    parser.add_argument("recording", help="fichero grabado con --record (JSONL, gzip si acaba en .gz)")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="0 = lo más rápido posible; 1 = velocidad real; 2 = el doble de rápido...")
+    parser.add_argument("--plugins", default=None, help="igual que en scheduler.py")
+    parser.add_argument("--strategy", choices=sorted(S.STRATEGIES), default="pods")
+    parser.add_argument("--scheduler-name", default=None, help="por defecto, el de la grabación")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--drain-timeout", type=float, default=15.0,
+                        help="segundos que se espera al final a los pods en backoff")
+    parser.add_argument("--decisions", default=None, metavar="FILE", help="guarda pod -> nodo en JSON")
+    parser.add_argument("--json", action="store_true", help="salida en JSON en lugar de tablas")
+    parser.add_argument("--log-level", default="CRITICAL", choices=("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"),
+                        help="logs del scheduler por stderr (por defecto ninguno: los fallos de bind grabados "
+                             "se repiten en cada reproducción)")
+    args = parser.parse_args()
+
+    try:
+        S.PROFILE = S.Profile.parse(args.plugins or S.STRATEGIES[args.strategy])
+    except ValueError as e:
+        parser.error(str(e))
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    S.log.handlers[:] = [handler]
+    S.log.setLevel(args.log_level)
+    S.log.propagate = False
+
+    report = run(args)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
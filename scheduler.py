@@ -1,85 +1,701 @@
 import argparse
+import collections
+import copy
+import asyncio
 import time
 import datetime
+import functools
+import gzip
+import hashlib
+import heapq
+import numpy as np
 from kubernetes import client, config, watch
+from kubernetes.utils import parse_quantity as k8s_quantity
 import signal
+import socket
+import uuid
 import random
 import json
+import math
 import os
+import threading
+import sys
+import atexit
+import cProfile
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+log = logging.getLogger("scheduler")
 
 running = True
 REJECTION_LABEL = "scheduler-rejected"
 REJECTION_TIMEOUT = 300  # segundos de ignorar un pod
+# Por defecto el rechazo sólo se guarda en memoria (sub-cola unschedulable, por UID).
+# Con --persist-rejections además se escribe la anotación en el pod, lo que sobrevive a
+# un reinicio del scheduler a cambio de un PATCH (y un MODIFIED de vuelta) por rechazo.
+PERSIST_REJECTIONS = False
 
 # -------------------------
 # Señales
 # -------------------------
 def signal_handler(sig, frame):
     global running
-    print("[INFO] Señal de terminación recibida, deteniendo scheduler…")
+    log.info("[INFO] Señal de terminación recibida, deteniendo scheduler…")
     running = False
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
+# -------------------------
+# Logging
+# -------------------------
+class NonBlockingQueueHandler(QueueHandler):
+    """ QueueHandler que nunca bloquea el bucle: la escritura a stdout la hace el hilo del
+        QueueListener y, si la cola se llena porque el pipe de logs va lento, la línea se
+        descarta y se cuenta en lugar de esperar.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        """ Como QueueHandler.prepare, pero la traza de la excepción se guarda formateada en
+            exc_text en lugar de pegarla al mensaje: el formato de texto la sigue añadiendo
+            al final y JsonFormatter la saca como campo "exc".
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class DebugRateLimit(logging.Filter):
+    """ Muestreo de las líneas DEBUG de alto volumen: como mucho `rate` por segundo desde
+        cada punto del código. Las que sobran se descartan y la siguiente que pasa indica
+        cuántas se han suprimido.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.windows = {}   # (módulo, línea) -> [inicio de la ventana, emitidas, suprimidas]
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+
+        site = (record.module, record.lineno)
+        window = self.windows.get(site)
+        if window is None or record.created - window[0] >= 1.0:
+            suppressed = window[2] if window else 0
+            self.windows[site] = [record.created, 1, 0]
+            if suppressed:
+                record.msg = f"{record.msg} (+{suppressed} suprimidas)"
+            return True
+
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        message = record.getMessage()
+        entry = {"ts": round(record.created, 6), "level": record.levelname, "thread": record.threadName}
+        # La etiqueta [EVENT], [POLICY]... pasa a ser un campo
+        if message.startswith("[") and "]" in message:
+            tag, _, rest = message[1:].partition("]")
+            entry["tag"] = tag
+            message = rest.lstrip()
+        entry["msg"] = message
+        # NonBlockingQueueHandler.prepare deja la traza ya formateada en exc_text
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+LOG_HANDLER = None
+
+
+def setup_logging(level="INFO", fmt="text", debug_rate=50, queue_size=10000):
+    """ Niveles reales (los log.debug no formatean nada si DEBUG está desactivado), salida
+        asíncrona a través de una cola y, opcionalmente, JSON estructurado.
+    """
+    global LOG_HANDLER
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(message)s"))
+
+    LOG_HANDLER = NonBlockingQueueHandler(Queue(maxsize=queue_size))
+    if debug_rate > 0:
+        LOG_HANDLER.addFilter(DebugRateLimit(debug_rate))
+
+    log.handlers[:] = [LOG_HANDLER]
+    log.setLevel(level)
+    log.propagate = False
+
+    listener = QueueListener(LOG_HANDLER.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+# -------------------------
+# Métricas (formato de exposición de Prometheus)
+# -------------------------
+METRICS = []
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def samples(self):
+        with self.lock:
+            return [(self.name + self._labels(key), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name} {value}" for name, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """ Gauge con valor fijado a mano o calculado al hacer scrape con set_function(fn), donde
+        fn devuelve un número o un dict {tupla de etiquetas: valor}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.function = None
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            value = self.function()
+            values = value if isinstance(value, dict) else {(): value}
+            return [(self.name + self._labels(key), v) for key, v in values.items()]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    out.append((self.name + "_bucket" + self._labels(key, ("le", bound)), cumulative))
+                out.append((self.name + "_bucket" + self._labels(key, ("le", "+Inf")), count))
+                out.append((self.name + "_sum" + self._labels(key), total))
+                out.append((self.name + "_count" + self._labels(key), count))
+        return out
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+SCHEDULING_LATENCY = Histogram("scheduler_e2e_scheduling_duration_seconds",
+                               "Tiempo desde que el pod entra en la cola hasta el bind correcto")
+PHASE_LATENCY = Histogram("scheduler_phase_duration_seconds",
+                          "Duración de cada fase: queue (espera en cola), decide (filtro y elección), bind (llamada al API)",
+                          ("phase",))
+API_REQUESTS = Counter("scheduler_api_requests_total", "Llamadas al API server por verbo y recurso",
+                       ("verb", "resource"))
+BIND_ATTEMPTS = Counter("scheduler_bind_attempts_total", "Intentos de bind")
+BIND_FAILURES = Counter("scheduler_bind_failures_total", "Binds fallidos por tipo de error", ("result",))
+REJECTIONS = Counter("scheduler_unschedulable_total", "Pods aparcados por no tener nodo compatible")
+QUEUE_DEPTH = Gauge("scheduler_queue_depth", "Pods en cada sub-cola de planificación", ("queue",))
+BIND_PENDING = Gauge("scheduler_pending_binds", "Binds pendientes (cola de reintentos o tareas en vuelo)")
+CACHE_SIZE = Gauge("scheduler_cache_objects", "Objetos en la caché local", ("kind",))
+TRACE_STORE = Gauge("scheduler_trace_store", "Registros de traza, expulsados y bytes estimados", ("stat",))
+LEADER_STATUS = Gauge("scheduler_leader", "1 si esta réplica es la líder")
+LEADER_STATUS.set_function(lambda: int(LEADING.is_set()))
+LEADER_TRANSITIONS = Counter("scheduler_leader_transitions_total", "Veces que esta réplica ha pasado a ser líder")
+FAILOVER_LATENCY = Histogram("scheduler_leader_failover_seconds",
+                             "Tiempo entre la última renovación del líder anterior y la toma del Lease")
+PLUGIN_DURATION = Histogram("scheduler_plugin_duration_seconds", "Duración de cada plugin por punto de extensión",
+                            ("point", "plugin"),
+                            buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01, 0.1, 1))
+SHARD_STATUS = Gauge("scheduler_shard", "Réplicas vivas y pods pendientes retenidos de otras réplicas", ("stat",))
+LOG_DROPPED = Gauge("scheduler_log_dropped_lines", "Líneas de log descartadas por cola llena")
+LOG_DROPPED.set_function(lambda: LOG_HANDLER.dropped if LOG_HANDLER else 0)
+
+# -------------------------
+# Servidor HTTP (/metrics)
+# -------------------------
+# ruta -> función(parámetros de la query) que devuelve (status, content-type, cuerpo)
+HTTP_ROUTES = {
+    "/metrics": lambda params: (200, "text/plain; version=0.0.4", render_metrics()),
+}
+
+
+class HttpHandler(BaseHTTPRequestHandler):
+    """ Sirve las rutas del servidor (server.routes) con los métodos que acepta
+        (server.methods): GET en /metrics y POST en las rutas de depuración, que tienen
+        efectos y se sirven aparte, sólo en 127.0.0.1.
+    """
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def _serve(self, method):
+        url = urlparse(self.path)
+        route = self.server.routes.get(url.path)
+        if route is None:
+            self.send_error(404)
+            return
+        if method not in self.server.methods:
+            self.send_error(405)
+            return
+        try:
+            status, content_type, body = route(parse_qs(url.query))
+        except Exception as e:
+            log.error("[ERROR] Error sirviendo %s: %s", url.path, e)
+            self.send_error(500)
+            return
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug("[HTTP] " + fmt, *args)
+
+
+def start_http_server(port, routes=HTTP_ROUTES, host="", methods=("GET",)):
+    server = ThreadingHTTPServer((host, port), HttpHandler)
+    server.daemon_threads = True
+    server.routes = routes
+    server.methods = methods
+    threading.Thread(target=server.serve_forever, name=f"http-{port}", daemon=True).start()
+    log.info("[HTTP] Sirviendo %s (%s) en %s:%s", ", ".join(sorted(routes)), "/".join(methods), host or "*", port)
+    return server
+
+# -------------------------
+# Perfilado bajo demanda (SIGUSR1 o /debug/profile)
+# -------------------------
+PROFILE_SECONDS = 30.0          # duración por defecto de una sesión
+PROFILE_MAX_SECONDS = 600.0
+PROFILE_SAMPLE_INTERVAL = 0.01  # segundos entre muestras en modo sample (100 Hz)
+PROFILE_MODES = ("sample", "cprofile")
+PROFILE_MODE = "sample"         # modo de las sesiones lanzadas con SIGUSR1
+
+
+class ProfileSession:
+    __slots__ = ("mode", "seconds", "path", "deadline", "profile", "done")
+
+    def __init__(self, mode, seconds, path):
+        self.mode = mode
+        self.seconds = seconds
+        self.path = path
+        self.deadline = time.monotonic() + seconds
+        self.profile = None
+        self.done = threading.Event()
+
+
+class CpuProfiler:
+    """ Una sesión de perfilado cada vez, acotada en tiempo, que se vuelca a directory:
+          - sample: un hilo toma cada PROFILE_SAMPLE_INTERVAL la pila de todos los hilos con
+            sys._current_frames() y escribe pilas colapsadas (.folded, para flamegraph.pl o
+            speedscope), una línea "hilo;func (fichero:línea);... muestras" por pila distinta.
+          - cprofile: cProfile sólo ve el hilo en el que se activa, así que lo activa y lo
+            para el propio bucle de planificación (tick) y se escribe en formato pstats.
+        Sin sesión activa no hay hilo ni hook: tick() es una comparación por vuelta del bucle.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.session = None
+
+    def start(self, seconds=PROFILE_SECONDS, mode="sample"):
+        """ Arranca una sesión y la devuelve, o None si ya hay una en curso. """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"modo de perfilado desconocido: {mode}")
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ValueError(f"duración fuera de rango (0, {PROFILE_MAX_SECONDS:g}]: {seconds}")
+        with self.lock:
+            if self.session is not None:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            ext = "folded" if mode == "sample" else "pstats"
+            stamp = time.strftime("%Y%m%d-%H%M%S") + f"{time.time() % 1:.3f}"[1:]
+            path = os.path.join(self.directory, f"profile-{stamp}-{mode}.{ext}")
+            session = ProfileSession(mode, seconds, path)
+            self.session = session
+        log.info("[PROFILE] Perfilando %.0fs en modo %s -> %s", seconds, mode, path)
+        if mode == "sample":
+            threading.Thread(target=self._sample, args=(session,), name="profile-sampler", daemon=True).start()
+        return session
+
+    def tick(self):
+        """ Lo llama el bucle de planificación en cada vuelta (modo cprofile). """
+        session = self.session
+        if session is None or session.mode != "cprofile":
+            return
+        if session.profile is None:
+            session.profile = cProfile.Profile()
+            session.profile.enable()
+        elif time.monotonic() >= session.deadline:
+            session.profile.disable()
+            session.profile.dump_stats(session.path)
+            self._finish(session, f"{len(session.profile.getstats())} funciones")
+
+    def _sample(self, session):
+        own = threading.get_ident()
+        stacks = collections.Counter()
+        samples = 0
+        while time.monotonic() < session.deadline and running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+
+        with open(session.path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self._finish(session, f"{samples} muestras, {len(stacks)} pilas distintas")
+
+    def _finish(self, session, summary):
+        with self.lock:
+            self.session = None
+        session.done.set()
+        log.info("[PROFILE] Perfil escrito en %s (%s)", session.path, summary)
+
+    def signal_handler(self, sig, frame):
+        # En el handler sólo se lanza un hilo: nada de locks ni E/S con el hilo principal interrumpido
+        threading.Thread(target=self._start_from_signal, name="profile-signal", daemon=True).start()
+
+    def _start_from_signal(self):
+        if self.start(PROFILE_SECONDS, PROFILE_MODE) is None:
+            log.warning("[PROFILE] Ya hay un perfilado en curso, se ignora la señal")
+
+    def http_route(self, params):
+        """ POST /debug/profile?seconds=30&mode=sample|cprofile[&wait=1]. Sin wait responde al
+            momento con la ruta del fichero; con wait espera a que acabe y devuelve el fichero.
+        """
+        try:
+            seconds = float(params.get("seconds", [PROFILE_SECONDS])[0])
+            mode = params.get("mode", [PROFILE_MODE])[0]
+            session = self.start(seconds, mode)
+        except ValueError as e:
+            return 400, "text/plain", f"{e}\n"
+        if session is None:
+            return 409, "text/plain", "ya hay un perfilado en curso\n"
+        if params.get("wait", ["0"])[0] not in ("1", "true"):
+            return 202, "application/json", json.dumps({"mode": mode, "seconds": seconds, "path": session.path})
+        if not session.done.wait(seconds + 10):
+            return 504, "text/plain", f"el perfil no ha terminado; se escribirá en {session.path}\n"
+        with open(session.path, "rb") as f:
+            body = f.read()
+        return 200, "text/plain" if mode == "sample" else "application/octet-stream", body
+
+
+CPU_PROFILER = None
+
 # -------------------------
 # Evento de trazas
 # -------------------------
-EVENTS = {}
+TRACE_MAX_PODS = 50000      # registros como máximo; al pasarse se expulsa el menos usado
+TRACE_MAX_AGE = 3600.0      # segundos sin tocar un registro antes de expulsarlo
+
+
+class TraceRecord:
+    """ Marcas de tiempo de un pod. Con __slots__ ocupa una fracción de un dict por pod. """
+    __slots__ = ("created", "added", "scheduled", "bound", "started", "node", "bind_attempts", "bind_retries",
+                 "touched")
+
+    def __init__(self, added=None):
+        self.created = None
+        self.added = added
+        self.scheduled = None
+        self.bound = None
+        self.started = None
+        self.node = None
+        self.bind_attempts = 0
+        self.bind_retries = 0
+        self.touched = time.time()
+
+
+# Tamaño estimado de una traza para la métrica de memoria: el registro, sus cinco marcas de
+# tiempo, una clave ns/nombre típica y la entrada del OrderedDict (~100 bytes con su nodo
+# de la lista enlazada). Recorrer todos los registros en cada scrape costaba decenas de ms
+# con el lock tomado.
+TRACE_RECORD_BYTES = (sys.getsizeof(TraceRecord()) + 5 * sys.getsizeof(0.0) +
+                      sys.getsizeof("default/" + "x" * 24) + 100)
+
+
+class TraceStore:
+    """ Trazas por ns/nombre en un OrderedDict usado como LRU: cada acceso mueve el registro
+        al final, así que los menos usados (y por tanto los más viejos) quedan al principio.
+        Se expulsan al borrar el pod, al superar max_pods o al pasar max_age sin tocarlos.
+    """
+    def __init__(self, max_pods=TRACE_MAX_PODS, max_age=TRACE_MAX_AGE):
+        self.max_pods = max_pods
+        self.max_age = max_age
+        self.records = collections.OrderedDict()
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def get(self, pod, create=True):
+        key = pod_key(pod)
+        now = time.time()
+        with self.lock:
+            record = self.records.get(key)
+            if record is not None:
+                self.records.move_to_end(key)
+            elif create:
+                created = pod.metadata.creation_timestamp
+                record = self.records[key] = TraceRecord(created.timestamp() if created else None)
+            else:
+                return None
+            record.touched = now
+            self._evict(now)
+            return record
+
+    def delete(self, pod):
+        with self.lock:
+            self.records.pop(pod_key(pod), None)
+
+    def _evict(self, now):
+        records = self.records
+        while records:
+            key, oldest = next(iter(records.items()))
+            if len(records) <= self.max_pods and now - oldest.touched <= self.max_age:
+                break
+            del records[key]
+            self.evicted += 1
 
-def record_trace(pod, event_type, timestamp=None):
-    """ De momento sólo guardamos el tiempo del máximo de lso contenedores que posee el pod.
-         se podría usar:
+    def __len__(self):
+        return len(self.records)
 
-        if "started" not in EVENTS[key] or EVENTS[key]["started"] is None:
-            EVENTS[key]["started"] = []
+    def memory_bytes(self):
+        """ Estimación del tamaño en O(1): TRACE_RECORD_BYTES por registro. """
+        return len(self.records) * TRACE_RECORD_BYTES
 
-        started_times = [
-            c.state.running.started_at.timestamp()
-            for c in container_statuses
-            if c.state.running
-        ]
+    def metric(self):
+        return {("records",): len(self), ("evicted",): self.evicted, ("bytes",): self.memory_bytes()}
 
-        if started_times:
-            EVENTS[key]["started"].extend(started_times)
-            print(f"[EVENT] type=STARTED pod={key} ts={started_times}")
+
+TRACES = TraceStore()
+
+
+class TraceExporter:
+    """ Vuelca cada evento de traza como una línea JSON a ficheros que rotan por tamaño
+        (sin comprimir), opcionalmente en gzip. Escribe un hilo aparte: emit() sólo encola
+        y, si la cola está llena, descarta el evento y lo cuenta en dropped.
+    """
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, compress=False, queue_size=100000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+        self.file = None
+        self.written = 0
+        self.index = 0
+        self.prefix = "trace-" + time.strftime("%Y%m%d-%H%M%S")
+        self.thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread.start()
+        atexit.register(self.stop)
+        log.info("[TRACE] Exportando trazas a %s (rotación cada %d bytes, gzip=%s)",
+                 self.directory, self.max_bytes, self.compress)
+
+    def emit(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+
+    def _open(self):
+        self.index += 1
+        path = os.path.join(self.directory, f"{self.prefix}-{self.index:04d}.jsonl")
+        if self.compress:
+            self.file = gzip.open(path + ".gz", "wt", encoding="utf-8")
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+        self.written = 0
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            if self.file is None or self.written >= self.max_bytes:
+                if self.file is not None:
+                    self.file.close()
+                self._open()
+            line = json.dumps(entry, separators=(",", ":")) + "\n"
+            self.file.write(line)
+            self.written += len(line)
+            # Sin más eventos esperando, se vacía el buffer para no perder trazas al matar el pod
+            if self.queue.empty():
+                self.file.flush()
+        if self.file is not None:
+            self.file.close()
+
+
+TRACE_EXPORTER = None
+
+
+def trace_bind_failure(pod, node, result):
+    """ Exporta un bind fallido con sus intentos. No deja marca en el registro: el pod
+        vuelve a la cola y el siguiente intento lo sobrescribe.
     """
+    if not TRACE_EXPORTER:
+        return
+    record = TRACES.get(pod, create=False)
+    TRACE_EXPORTER.emit({"pod": pod_key(pod), "event": "bind_failed", "ts": time.time(), "node": node,
+                         "result": result,
+                         "bind_attempts": record.bind_attempts if record else 0,
+                         "bind_retries": record.bind_retries if record else 0})
+
 
+def record_trace(pod, event_type, timestamp=None, node=None):
+    """ De momento sólo guardamos el tiempo del máximo de los contenedores que posee el pod.
+        El STARTED sólo se apunta en pods que ya tienen traza (los que ha visto este scheduler),
+        para no crear un registro por cada pod Running del clúster.
+    """
     ts = timestamp or time.time()
     key = f"{pod.metadata.namespace}/{pod.metadata.name}"
-
-    if key not in EVENTS:
-        EVENTS[key] = {
-            "created": None,
-            "added": pod.metadata.creation_timestamp.timestamp(),
-            "scheduled": None,
-            "bound": None,
-            "started": None
-        }
     et = event_type.lower()
 
+    record = TRACES.get(pod, create=(et != "started"))
+    if record is None:
+        return
+
+    if node:
+        record.node = node
 
     if et in ("created", "added", "scheduled", "bound"):
-        EVENTS[key][et] = ts
-        print(f"[EVENT] {key}: {event_type.upper()} detectado a {ts}")
+        setattr(record, et, ts)
+        log.debug("[EVENT] %s: %s detectado a %s", key, event_type.upper(), ts)
+        if TRACE_EXPORTER:
+            entry = {"pod": key, "event": et, "ts": ts}
+            if et in ("scheduled", "bound"):
+                entry["node"] = record.node
+            if et == "bound":
+                entry["bind_attempts"] = record.bind_attempts
+                entry["bind_retries"] = record.bind_retries
+            TRACE_EXPORTER.emit(entry)
         # Calcular latencia automáticamente si es BOUND
         if et == "bound":
-            added_ts = EVENTS[key].get("added")
+            added_ts = record.added
             if added_ts:
                 latency = ts - added_ts
-                print(f"[EVENT]  ADDED {key} ts={added_ts}")
-                print(f"[LATENCY] {key}: ADDED -> BOUND = {latency:.2f}s")
+                log.debug("[EVENT]  ADDED %s ts=%s", key, added_ts)
+                log.info("[LATENCY] %s: ADDED -> BOUND = %.2fs", key, latency)
+                SCHEDULING_LATENCY.observe(latency)
         return
 
-    print(f"[EVENT] {event_type}: {key} at {ts}")
+    log.debug("[EVENT] %s: %s at %s", event_type, key, ts)
 
-    if event_type == "started":
+    if et == "started":
         container_statuses = pod.status.container_statuses or []
         if not container_statuses:
-            print(f"[EVENT] type=STARTED pod={key} ts=none_no_container_status")
+            log.debug("[EVENT] type=STARTED pod=%s ts=none_no_container_status", key)
             return
         # Evitar sobreescritura accidental
-        if EVENTS[key]["started"] is not None:
+        if record.started is not None:
             return
 
         started_times = [
@@ -88,13 +704,19 @@ def record_trace(pod, event_type, timestamp=None):
             if c.state.running
         ]
         if started_times:
-            EVENTS[key]["started"] = max(started_times)
-            print(f"[EVENT] type=STARTED pod={key} ts={EVENTS[key]['started']}")
+            record.started = max(started_times)
+            log.debug("[EVENT] type=STARTED pod=%s ts=%s", key, record.started)
+            if TRACE_EXPORTER:
+                TRACE_EXPORTER.emit({"pod": key, "event": "started", "ts": record.started, "node": record.node})
+
 # -------------------------
 # Rechazo de pods
 # -------------------------
-def pod_recently_rejected(pod):
-    print(f"[DEBUG] Comprobando rechazo reciente del pod {pod.metadata.name}")
+def pod_recent_rejection(pod):
+    """ Instante (en segundos de time.time()) del rechazo anotado en el pod si no ha pasado
+        REJECTION_TIMEOUT, o None.
+    """
+    log.debug("[DEBUG] Comprobando rechazo reciente del pod %s", pod.metadata.name)
 
     if pod.metadata.annotations and REJECTION_LABEL in pod.metadata.annotations:
         ts_str = pod.metadata.annotations[REJECTION_LABEL]
@@ -102,35 +724,38 @@ def pod_recently_rejected(pod):
         now = datetime.datetime.utcnow()
         time_diff = (now - ts).total_seconds()
 
-        print(f"[DEBUG] Pod fue rechazado anteriormente: {ts_str}")
-        print(f"[DEBUG] Tiempo desde rechazo: {time_diff:.1f}s (timeout={REJECTION_TIMEOUT}s)")
-        print(f"[DEBUG] Estado rechazo: {time_diff < REJECTION_TIMEOUT}")
+        log.debug("[DEBUG] Pod fue rechazado anteriormente: %s", ts_str)
+        log.debug("[DEBUG] Tiempo desde rechazo: %.1fs (timeout=%ss)", time_diff, REJECTION_TIMEOUT)
+        log.debug("[DEBUG] Estado rechazo: %s", time_diff < REJECTION_TIMEOUT)
 
-        return time_diff < REJECTION_TIMEOUT
+        if time_diff < REJECTION_TIMEOUT:
+            return time.time() - time_diff
+        return None
 
-    print(f"[DEBUG] Pod {pod.metadata.name} no tiene anotación de rechazo")
-    return False
+    log.debug("[DEBUG] Pod %s no tiene anotación de rechazo", pod.metadata.name)
+    return None
 
 
 def mark_pod_rejected(api, pod):
-    print(f"[DEBUG] Marcando pod como rechazado: {pod.metadata.name}")
+    log.debug("[DEBUG] Marcando pod como rechazado: %s", pod.metadata.name)
 
     if not pod.metadata.annotations:
         pod.metadata.annotations = {}
-        print("[DEBUG] Inicializando anotaciones vacías")
+        log.debug("[DEBUG] Inicializando anotaciones vacías")
 
     rejection_timestamp = datetime.datetime.utcnow().isoformat()
     pod.metadata.annotations[REJECTION_LABEL] = rejection_timestamp
-    print(f"[DEBUG] Guardado timestamp de rechazo: {rejection_timestamp}")
+    log.debug("[DEBUG] Guardado timestamp de rechazo: %s", rejection_timestamp)
 
     body = {"metadata": {"annotations": pod.metadata.annotations}}
-    print(f"[DEBUG] PATCH body: {body}")
+    log.debug("[DEBUG] PATCH body: %s", body)
 
     try:
+        API_REQUESTS.inc(verb="patch", resource="pods")
         api.patch_namespaced_pod(pod.metadata.name, pod.metadata.namespace, body)
-        print(f"[INFO] Pod {pod.metadata.name} marcado como rechazado")
+        log.info("[INFO] Pod %s marcado como rechazado", pod.metadata.name)
     except Exception as e:
-        print(f"[ERROR] Error aplicando rechazo al pod {pod.metadata.name}: {e}")
+        log.error("[ERROR] Error aplicando rechazo al pod %s: %s", pod.metadata.name, e)
         raise
 
 # -------------------------
@@ -139,10 +764,10 @@ def mark_pod_rejected(api, pod):
 def load_client(kubeconfig=None):
     try:
         if kubeconfig:
-            print("[CONFIG] Cargando kubeconfig local…")
+            log.info("[CONFIG] Cargando kubeconfig local…")
             config.load_kube_config(config_file=kubeconfig)
         else:
-            print("[CONFIG] Cargando configuración en cluster…")
+            log.info("[CONFIG] Cargando configuración en cluster…")
             config.load_incluster_config()
     except Exception as e:
         raise RuntimeError(f"Error al cargar configuración: {e}")
@@ -152,187 +777,2418 @@ def load_client(kubeconfig=None):
 # -------------------------
 # Compatibilidad de nodos
 # -------------------------
+# Motivos por los que un pod no cabe; se guardan al aparcarlo para saber qué cambios del
+# clúster pueden hacer que quepa (ver SchedulingQueue.on_node_change)
+REASON_NO_NODES = "NoNodes"
+REASON_NODE_ENV = "NodeEnv"
+REASON_TAINT = "Taint"
+REASON_RESOURCES = "Resources"
+ALL_REASONS = frozenset({REASON_NO_NODES, REASON_NODE_ENV, REASON_TAINT, REASON_RESOURCES})
+
+
+COMPAT_CACHE_SIZE = 65536
+
+
+class NodeFilter:
+    """ Lo que el filtrado necesita de un nodo, precompilado cuando el nodo cambia: la
+        etiqueta env y los taints como conjunto hasheable. Se identifica por
+        (nombre, resourceVersion), que es la clave de la memoización de compatibilidad.
+    """
+    __slots__ = ("name", "resource_version", "env", "taints")
+
+    def __init__(self, node):
+        self.name = node.metadata.name
+        self.resource_version = node.metadata.resource_version
+        self.env = node.metadata.labels.get("env") if node.metadata.labels else None
+        self.taints = frozenset((t.key, t.value or "", t.effect) for t in node.spec.taints or [])
+
+    def __hash__(self):
+        return hash((self.name, self.resource_version))
+
+    def __eq__(self, other):
+        return self.name == other.name and self.resource_version == other.resource_version
+
+
+NODE_FILTERS = {}
+
+
+def node_filter(node):
+    nf = NODE_FILTERS.get(node.metadata.name)
+    if nf is None or nf.resource_version != node.metadata.resource_version:
+        nf = NodeFilter(node)
+        NODE_FILTERS[nf.name] = nf
+    return nf
+
+
+# Sin allocatable (nodos sin status) se considera que caben pods sin límite
+UNLIMITED = 2 ** 62
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_quantity(quantity):
+    """ Cantidad de Kubernetes ("250m", "1Gi", "2") en milésimas: milicores para la CPU y
+        milésimas de byte para la memoria, siempre enteros para que las sumas no acumulen
+        error. Memoizado: las cantidades se repiten mucho y parse_quantity usa Decimal.
+    """
+    return int(math.ceil(k8s_quantity(quantity) * 1000))
+
+
+def pod_requests(pod):
+    """ (cpu, memoria) pedidos por el pod: suma de los contenedores o el mayor de los init
+        containers si es más. Sin requests pero con limits, cuentan los limits.
+    """
+    def requests(container):
+        resources = container.resources
+        if resources is None:
+            return 0, 0
+        values = resources.requests or resources.limits or {}
+        return parse_quantity(values.get("cpu", "0")), parse_quantity(values.get("memory", "0"))
+
+    cpu = mem = 0
+    for container in pod.spec.containers or []:
+        c, m = requests(container)
+        cpu += c
+        mem += m
+    for container in pod.spec.init_containers or []:
+        c, m = requests(container)
+        cpu = max(cpu, c)
+        mem = max(mem, m)
+    return cpu, mem
+
+
+def node_allocatable(node):
+    """ (cpu, memoria, pods) asignables del nodo, en las unidades de parse_quantity. """
+    allocatable = node.status.allocatable if node.status else None
+    if not allocatable:
+        return UNLIMITED, UNLIMITED, UNLIMITED
+    pods = allocatable.get("pods")
+    return (parse_quantity(allocatable["cpu"]) if "cpu" in allocatable else UNLIMITED,
+            parse_quantity(allocatable["memory"]) if "memory" in allocatable else UNLIMITED,
+            int(pods) if pods else UNLIMITED)
+
+
+def toleration_signature(pod):
+    # Los pods de un mismo ReplicaSet comparten tolerations y, por tanto, firma
+    tolerations = pod.spec.tolerations
+    if not tolerations:
+        return ()
+    return tuple(sorted((t.key or "", t.operator or "Equal", t.value or "", t.effect or "")
+                        for t in tolerations))
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_tolerations(signature):
+    exists = frozenset((key, effect) for key, op, _, effect in signature if op == "Exists")
+    equal = frozenset((key, value, effect) for key, op, value, effect in signature if op == "Equal")
+    return exists, equal
+
+
+@functools.lru_cache(maxsize=COMPAT_CACHE_SIZE)
+def filter_reason(nf, signature):
+    """ (nodo, resourceVersion) x firma de tolerations -> motivo de rechazo o None.
+        Memoizado: sólo se evalúa la primera vez que se ve cada combinación.
+    """
+    log.debug("[DEBUG] Verificando compatibilidad nodo=%s rv=%s tolerations=%s", nf.name, nf.resource_version, len(signature))
+
+    if nf.env != "prod":
+        log.debug("[DEBUG] Nodo %s rechazado: env != prod", nf.name)
+        return REASON_NODE_ENV
+
+    if not nf.taints:
+        return None
+
+    exists, equal = compile_tolerations(signature)
+    for key, value, effect in nf.taints:
+        if (key, effect) not in exists and (key, value, effect) not in equal:
+            log.debug("[DEBUG] Nodo %s no tolera el taint %s", nf.name, key)
+            return REASON_TAINT
+
+    log.debug("[DEBUG] Nodo %s compatible", nf.name)
+    return None
+
+
+def incompatibility_reason(node, pod):
+    return filter_reason(node_filter(node), toleration_signature(pod))
+
+
 def is_node_compatible(node, pod):
-    print(f"[DEBUG] Verificando compatibilidad pod={pod.metadata.name} nodo={node.metadata.name}")
+    return incompatibility_reason(node, pod) is None
 
-    node_env = node.metadata.labels.get("env") if node.metadata.labels else None
 
-    if node_env != "prod":
-        print(f"[DEBUG] Nodo {node.metadata.name} rechazado: env != prod")
-        return False
-    
-    print(f"[DEBUG] Nodo {node.metadata.name} tiene env=prod")
+def compatible_nodes(nodes, pod):
+    signature = toleration_signature(pod)
+    return [n for n in nodes if filter_reason(node_filter(n), signature) is None]
 
-    node_taints = node.spec.taints or []
-    pod_tolerations = pod.spec.tolerations or []
 
-    if not node_taints:
-        return True
+def unschedulable_reasons(nodes, pod):
+    if not nodes:
+        return {REASON_NO_NODES}
+    signature = toleration_signature(pod)
+    return {filter_reason(node_filter(n), signature) for n in nodes} - {None}
+
+
+def node_change_hints(old, new):
+    """ Motivos de rechazo que un cambio de nodo puede resolver (conjunto vacío si el
+        cambio no afecta al filtrado, p.ej. los heartbeats de status).
+    """
+    if new is None:
+        return set()
+    if old is None:
+        return set(ALL_REASONS)
+
+    hints = set()
+    old_filter = NodeFilter(old)
+    new_filter = node_filter(new)
+    if old_filter.env != new_filter.env:
+        hints.add(REASON_NODE_ENV)
+    if old_filter.taints != new_filter.taints:
+        hints.add(REASON_TAINT)
+    if node_allocatable(old) != node_allocatable(new):
+        hints.add(REASON_RESOURCES)
+    return hints
+
+# -------------------------
+# Decodificación rápida de pods y nodos
+# -------------------------
+# Con RAW_DECODE los LIST y WATCH piden la respuesta sin deserializar (_preload_content=False),
+# la decodifican con orjson si está instalado y se quedan sólo con los campos que usa el
+# scheduler, en objetos con __slots__ que tienen los mismos nombres de atributo que V1Pod y
+# V1Node. El resto del código no distingue unos de otros.
+RAW_DECODE = True
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+
+def parse_time(value):
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class MetaRecord:
+    __slots__ = ("name", "namespace", "uid", "resource_version", "labels", "annotations", "creation_timestamp")
+
+    def __init__(self, d):
+        self.name = d.get("name")
+        self.namespace = d.get("namespace")
+        self.uid = d.get("uid")
+        self.resource_version = d.get("resourceVersion")
+        self.labels = d.get("labels")
+        self.annotations = d.get("annotations")
+        self.creation_timestamp = parse_time(d.get("creationTimestamp"))
+
+
+class TolerationRecord:
+    # Sirve también para los taints (sin operator)
+    __slots__ = ("key", "operator", "value", "effect")
+
+    def __init__(self, d):
+        self.key = d.get("key")
+        self.operator = d.get("operator")
+        self.value = d.get("value")
+        self.effect = d.get("effect")
+
+
+class ResourcesRecord:
+    __slots__ = ("requests", "limits")
+
+    def __init__(self, d):
+        self.requests = d.get("requests")
+        self.limits = d.get("limits")
+
+
+class ContainerRecord:
+    __slots__ = ("name", "resources")
+
+    def __init__(self, d):
+        self.name = d.get("name")
+        resources = d.get("resources")
+        self.resources = ResourcesRecord(resources) if resources else None
+
+
+class RunningRecord:
+    __slots__ = ("started_at",)
+
+    def __init__(self, d):
+        self.started_at = parse_time(d.get("startedAt"))
+
+
+class StateRecord:
+    __slots__ = ("running",)
+
+    def __init__(self, d):
+        running = d.get("running")
+        self.running = RunningRecord(running) if running else None
+
+
+class ContainerStatusRecord:
+    __slots__ = ("name", "state")
+
+    def __init__(self, d):
+        self.name = d.get("name")
+        self.state = StateRecord(d.get("state") or {})
+
+
+class PodSpecRecord:
+    __slots__ = ("node_name", "scheduler_name", "priority", "tolerations", "containers", "init_containers")
+
+    def __init__(self, d):
+        self.node_name = d.get("nodeName")
+        self.scheduler_name = d.get("schedulerName")
+        self.priority = d.get("priority")
+        tolerations = d.get("tolerations")
+        self.tolerations = [TolerationRecord(t) for t in tolerations] if tolerations else None
+        self.containers = [ContainerRecord(c) for c in d.get("containers") or ()]
+        init_containers = d.get("initContainers")
+        self.init_containers = [ContainerRecord(c) for c in init_containers] if init_containers else None
+
+
+class PodStatusRecord:
+    __slots__ = ("phase", "container_statuses")
+
+    def __init__(self, d):
+        self.phase = d.get("phase")
+        statuses = d.get("containerStatuses")
+        self.container_statuses = [ContainerStatusRecord(c) for c in statuses] if statuses else None
+
+
+class PodRecord:
+    __slots__ = ("metadata", "spec", "status")
+
+    def __init__(self, d):
+        self.metadata = MetaRecord(d.get("metadata") or {})
+        self.spec = PodSpecRecord(d.get("spec") or {})
+        self.status = PodStatusRecord(d.get("status") or {})
+
+
+class NodeSpecRecord:
+    __slots__ = ("taints",)
+
+    def __init__(self, d):
+        taints = d.get("taints")
+        self.taints = [TolerationRecord(t) for t in taints] if taints else None
+
+
+class NodeStatusRecord:
+    __slots__ = ("allocatable",)
+
+    def __init__(self, d):
+        self.allocatable = d.get("allocatable")
+
+
+class NodeRecord:
+    __slots__ = ("metadata", "spec", "status")
 
-    for taint in node_taints:
-        tolerated = False
-        print(f"[DEBUG] Revisando taint: {taint.key}={getattr(taint, 'value', None)}:{taint.effect}")
+    def __init__(self, d):
+        self.metadata = MetaRecord(d.get("metadata") or {})
+        self.spec = NodeSpecRecord(d.get("spec") or {})
+        self.status = NodeStatusRecord(d.get("status") or {})
 
-        for tol in pod_tolerations:
-            print(f"[DEBUG] Comparando toleration: {tol.key}={getattr(tol, 'value', None)}:{tol.effect}")
 
-            if tol.key != taint.key:
+class ListRecord:
+    __slots__ = ("items", "metadata")
+
+    def __init__(self, items, metadata):
+        self.items = items
+        self.metadata = metadata
+
+
+# función de lista del cliente -> (recurso, clase de registro)
+LIST_FUNCS = {"list_node": ("nodes", NodeRecord), "list_pod_for_all_namespaces": ("pods", PodRecord)}
+
+
+def list_objects(list_func, **kwargs):
+    """ LIST con el decodificador rápido si está activo; si no, el del cliente. """
+    resource, record = LIST_FUNCS[list_func.__name__]
+    API_REQUESTS.inc(verb="list", resource=resource)
+    if not RAW_DECODE:
+        return list_func(**kwargs)
+    resp = list_func(_preload_content=False, **kwargs)
+    data = json_loads(resp.data)
+    return ListRecord([record(item) for item in data.get("items") or ()], MetaRecord(data.get("metadata") or {}))
+
+
+def iter_lines(resp):
+    """ Líneas (bytes) de una respuesta en streaming; cada línea es un evento del watch. """
+    pending = b""
+    for chunk in resp.stream(65536, decode_content=True):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line:
+                yield line
+    if pending.strip():
+        yield pending
+
+# -------------------------
+# WATCH reanudable (resourceVersion + bookmarks)
+# -------------------------
+HTTP_GONE = 410
+RELIST_BACKOFF_MAX = 30.0   # segundos de espera máxima entre relists fallidos
+
+
+class ResumableWatch:
+    """ Stream de eventos que se reanuda desde el último resourceVersion visto, de modo
+        que reconectar cada timeout_seconds no vuelve a enviar todos los objetos como ADDED.
+        Pide allowWatchBookmarks para que el API server mantenga el resourceVersion al día
+        aunque no haya cambios. Si el resourceVersion ha caducado (410 Gone) se llama a
+        relist(), que devuelve los eventos sintéticos del diff y el nuevo resourceVersion;
+        si el relist falla se reintenta con backoff exponencial hasta RELIST_BACKOFF_MAX.
+    """
+
+    def __init__(self, name, list_func, resource_version, relist, timeout_seconds=60, **kwargs):
+        self.name = name
+        self.list_func = list_func
+        self.resource_version = resource_version
+        self.relist = relist
+        self.timeout_seconds = timeout_seconds
+        self.kwargs = kwargs
+        self.watch = watch.Watch()
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+        self.watch.stop()
+
+    def _typed_events(self):
+        for event in self.watch.stream(self.list_func,
+                                       resource_version=self.resource_version,
+                                       allow_watch_bookmarks=True,
+                                       timeout_seconds=self.timeout_seconds,
+                                       **self.kwargs):
+            if event["type"] == "BOOKMARK":
+                self.resource_version = event["raw_object"]["metadata"]["resourceVersion"]
                 continue
 
-            if tol.effect != taint.effect:
+            obj = event["object"]
+            if not obj or not hasattr(obj, "metadata"):
                 continue
 
-            operator = tol.operator if tol.operator else "Equal"
+            self.resource_version = obj.metadata.resource_version
+            yield event["type"], obj
 
-            if operator == "Exists":
-                tolerated = True
-                break
+    def _raw_events(self, record):
+        resp = self.list_func(watch=True,
+                              resource_version=self.resource_version,
+                              allow_watch_bookmarks=True,
+                              timeout_seconds=self.timeout_seconds,
+                              _preload_content=False,
+                              **self.kwargs)
+        try:
+            for line in iter_lines(resp):
+                event = json_loads(line)
+                event_type, obj = event.get("type"), event.get("object") or {}
+                if event_type == "ERROR":
+                    # El 410 Gone llega como evento ERROR con un Status dentro
+                    raise client.rest.ApiException(status=obj.get("code"), reason=obj.get("message"))
+
+                self.resource_version = obj.get("metadata", {}).get("resourceVersion", self.resource_version)
+                if event_type == "BOOKMARK":
+                    continue
+                yield event_type, record(obj)
+
+                if self.stopped:
+                    return
+        finally:
+            resp.release_conn()
+
+    def stream(self):
+        resource, record = LIST_FUNCS.get(getattr(self.list_func, "__name__", ""), (self.name, None))
+        needs_relist = False
+        relist_failures = 0
+        while running:
+            try:
+                # El relist va dentro del try: si el LIST falla (5xx/429 con el API server
+                # cargado) se reintenta con backoff en lugar de matar el hilo del watch
+                if needs_relist:
+                    events, self.resource_version = self.relist()
+                    needs_relist = False
+                    relist_failures = 0
+                    log.info("[WATCH] %s: relist con %s cambios, rv=%s", self.name, len(events), self.resource_version)
+                    for event_type, obj in events:
+                        yield event_type, obj
+
+                API_REQUESTS.inc(verb="watch", resource=resource)
+                events = self._raw_events(record) if RAW_DECODE and record else self._typed_events()
+                for event_type, obj in events:
+                    yield event_type, obj
+
+                    if not running:
+                        return
+
+            except Exception as e:
+                if isinstance(e, client.rest.ApiException) and e.status == HTTP_GONE and not needs_relist:
+                    log.info("[WATCH] %s: resourceVersion %s expirado (410 Gone), relist",
+                             self.name, self.resource_version)
+                    needs_relist = True
+                    continue
 
-            if operator == "Equal" and getattr(tol, "value", None) == getattr(taint, "value", None):
-                tolerated = True
-                break
+                if needs_relist:
+                    delay = min(RELIST_BACKOFF_MAX, 2 ** relist_failures)
+                    relist_failures += 1
+                    log.error("[ERROR] Relist de %s fallido: %s; reintento en %ss", self.name, e, delay)
+                else:
+                    delay = 1
+                    log.error("[ERROR] Error en el watch de %s: %s", self.name, e)
+                time.sleep(delay)
+
+# -------------------------
+# Grabación de eventos (--record)
+# -------------------------
+class EventRecorder:
+    """ Graba en JSONL con gzip todo lo que entra al scheduler: el LIST inicial, los eventos
+        de nodos y pods en el orden en que se consumen (incluidos los sintéticos de un relist)
+        y el código de respuesta de cada bind, con el instante relativo al arranque.
+        benchmarking/replay.py lo vuelve a pasar por la caché, la cola y pick_nodes.
+
+        Como TraceExporter, emit() sólo encola: la conversión a JSON y la escritura las hace
+        un hilo aparte y si la cola se llena el evento se descarta y se cuenta en dropped.
+    """
 
-        if not tolerated:
-            print(f"[DEBUG] Nodo {node.metadata.name} no tolera el taint {taint.key}")
-            return False
+    def __init__(self, path, queue_size=100000):
+        self.path = path
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+        self.origin = time.monotonic()
+        self.api_client = client.ApiClient()
+        self.fields = {}    # clase de registro -> [(atributo, clave JSON)]
+        self.thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        atexit.register(self.stop)
+        log.info("[RECORD] Grabando eventos en %s", self.path)
+
+    def emit(self, kind, **entry):
+        entry["k"] = kind
+        entry["t"] = round(time.monotonic() - self.origin, 6)
+        try:
+            self.queue.put_nowait(entry)
+        except Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+            if self.dropped:
+                log.warning("[RECORD] %s eventos descartados por cola llena; la grabación está incompleta",
+                            self.dropped)
+
+    def plain(self, obj):
+        """ Modelo V1 o registro ligero -> dict con los nombres de campo del API. """
+        if isinstance(obj, list):
+            return [self.plain(o) for o in obj]
+        if isinstance(obj, datetime.datetime):
+            return obj.isoformat()
+        if hasattr(obj, "openapi_types"):
+            return self.api_client.sanitize_for_serialization(obj)
+        slots = getattr(type(obj), "__slots__", None)
+        if slots is None:
+            return obj
+        fields = self.fields.get(type(obj))
+        if fields is None:
+            fields = [(s, s.split("_")[0] + "".join(w.title() for w in s.split("_")[1:])) for s in slots]
+            self.fields[type(obj)] = fields
+        return {name: self.plain(value) for attr, name in fields if (value := getattr(obj, attr)) is not None}
+
+    def _run(self):
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            while True:
+                entry = self.queue.get()
+                if entry is None:
+                    break
+                for field in ("o", "nodes", "pods"):
+                    if field in entry:
+                        entry[field] = self.plain(entry[field])
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
 
-    print(f"[DEBUG] Nodo {node.metadata.name} compatible")
-    return True
+
+RECORDER = None
 
 # -------------------------
-# Selección de nodo
+# Caché de nodos y pods (estilo informer)
 # -------------------------
-def choose_node(api, pod):
-    print(f"[DEBUG] Seleccionando nodo para pod {pod.metadata.name}")
+ASSUME_TTL = 30.0  # segundos que se mantiene una colocación supuesta sin confirmar
 
-    all_nodes = api.list_node().items
-    nodes = [n for n in all_nodes if is_node_compatible(n, pod)]
 
-    if not nodes:
+def pod_key(pod):
+    return f"{pod.metadata.namespace}/{pod.metadata.name}"
+
+
+def _diff(cached, listed):
+    # Eventos sintéticos para pasar de la caché al resultado de un LIST
+    events = []
+    for key, obj in listed.items():
+        old = cached.get(key)
+        if old is None:
+            events.append(("ADDED", obj))
+        elif old.metadata.resource_version != obj.metadata.resource_version:
+            events.append(("MODIFIED", obj))
+    for key, obj in cached.items():
+        if key not in listed:
+            events.append(("DELETED", obj))
+    return events
+
+
+class NodeTable:
+    """ Los mismos datos de carga que ClusterCache, pero en arrays NumPy indexados por nodo,
+        para que los plugins de score trabajen sobre todos los nodos a la vez. Se actualiza
+        en O(1) con cada pod y se reconstruye sólo al entrar o salir nodos. Las máscaras de
+        compatibilidad se memoizan por firma de tolerations hasta el siguiente cambio de
+        filtrado de algún nodo.
+
+        Las columnas de allocatable (cpu, memoria, pods) sólo cambian al reconstruir; las de
+        requested (cpu, memoria) se actualizan con cada pod como la carga.
+    """
+    def __init__(self):
+        self.names = []          # índice -> nombre (la lista se sustituye, nunca se modifica)
+        self.index = {}          # nombre -> índice
+        self.load = np.zeros(0, dtype=np.int64)
+        self.app_load = {}       # app -> array de pods de esa app por nodo
+        self.allocatable = np.zeros((3, 0), dtype=np.int64)   # filas cpu, memoria, pods
+        self.requested = np.zeros((2, 0), dtype=np.int64)     # filas cpu, memoria
+        self.masks = {}          # firma de tolerations -> array bool de nodos compatibles
+
+    def rebuild(self, nodes, node_load, app_load, requested):
+        self.names = list(nodes)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.load = np.array([node_load.get(name, 0) for name in self.names], dtype=np.int64)
+        # Una fila por recurso: cada columna de recurso es contigua para operar sobre todos los nodos
+        self.allocatable = np.ascontiguousarray(np.array(
+            [node_allocatable(nodes[name]) for name in self.names], dtype=np.int64).reshape(-1, 3).T)
+        self.requested = np.ascontiguousarray(np.array(
+            [requested.get(name, (0, 0)) for name in self.names], dtype=np.int64).reshape(-1, 2).T)
+        self.app_load = {}
+        for (node_name, app), count in app_load.items():
+            i = self.index.get(node_name)
+            if i is not None:
+                self._app(app)[i] = count
+        self.masks = {}
+
+    def _app(self, app):
+        loads = self.app_load.get(app)
+        if loads is None:
+            loads = self.app_load[app] = np.zeros(len(self.names), dtype=np.int64)
+        return loads
+
+    def add(self, entry, delta):
+        node_name, app, cpu, mem = entry
+        i = self.index.get(node_name)
+        if i is None:
+            return
+        self.load[i] += delta
+        self.requested[0, i] += delta * cpu
+        self.requested[1, i] += delta * mem
+        if app is not None:
+            self._app(app)[i] += delta
+
+    def mask(self, nodes, signature):
+        mask = self.masks.get(signature)
+        if mask is None:
+            mask = np.fromiter((filter_reason(node_filter(nodes[name]), signature) is None for name in self.names),
+                               dtype=bool, count=len(self.names))
+            self.masks[signature] = mask
+        return mask
+
+
+class NodeView:
+    """ Foto de la tabla de nodos para programar un pod: copias de los arrays, así que los
+        plugins no necesitan el lock de la caché.
+    """
+    __slots__ = ("names", "compatible", "load", "app_load", "allocatable", "requested", "request")
+
+    def __init__(self, names, compatible, load, app_load, allocatable, requested, request):
+        self.names = names
+        self.compatible = compatible
+        self.load = load
+        self.app_load = app_load        # None si el pod no tiene app
+        self.allocatable = allocatable  # (3, N): cpu, memoria, pods
+        self.requested = requested      # (2, N): cpu, memoria de los pods ya colocados
+        self.request = request          # (cpu, memoria) del pod a programar
+
+
+class ClusterCache:
+    """ Copia en memoria de nodos y pods. Se hace un único LIST al arrancar y a partir de
+        ahí se mantiene con WATCH: los nodos con un hilo propio y los pods con los eventos
+        del watch principal. choose_node e is_node_compatible leen de aquí, de forma que
+        programar un pod no hace ninguna llamada LIST al API server.
+
+        Además mantiene un índice de carga por nodo (total y por etiqueta app) que se
+        actualiza en O(1) con cada evento: sólo cuentan los pods asignados que no han
+        terminado (Succeeded/Failed).
+    """
+
+    def __init__(self, api, pod_field_selector=None):
+        self.api = api
+        # En modo --filtered-watch sólo interesan los pods ya asignados (carga por nodo)
+        self.pod_field_selector = pod_field_selector
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.pods = {}
+        self.node_load = {}      # nodo -> nº de pods activos
+        self.app_load = {}       # (nodo, app) -> nº de pods activos
+        self.requested = {}      # nodo -> (cpu, memoria) pedidos por sus pods activos
+        self.accounted = {}      # pod -> (nodo, app, cpu, memoria) con el que se contabilizó
+        self.assumed = {}        # pod -> caducidad de la colocación supuesta (ver assume)
+        self.node_rv = None
+        self.pod_rv = None
+        self.node_thread = None
+        self.node_listeners = []   # callbacks (nodo, hints) ante cambios que afectan al filtrado
+        self.table = NodeTable()
+
+    def sync(self):
+        log.info("[CACHE] LIST inicial de nodos y pods")
+        node_list = list_objects(self.api.list_node)
+        pod_list = self._list_pods()
+        nodes = node_list.items
+        pods = pod_list.items
+        self.node_rv = node_list.metadata.resource_version
+        self.pod_rv = pod_list.metadata.resource_version
+        if RECORDER:
+            RECORDER.emit("sync", nodes=list(nodes), pods=list(pods))
+        self.reset(nodes, pods)
+        log.info("[CACHE] Sincronizado: %s nodos, %s pods", len(self.nodes), len(self.pods))
+
+    def reset(self, nodes, pods):
+        """ Sustituye el contenido de la caché por estos nodos y pods (LIST inicial o replay). """
+        with self.lock:
+            self.nodes = {n.metadata.name: n for n in nodes}
+            for n in nodes:
+                node_filter(n)
+            self.pods = {}
+            self.node_load = {}
+            self.app_load = {}
+            self.requested = {}
+            self.accounted = {}
+            self.assumed = {}
+            for p in pods:
+                key = pod_key(p)
+                self.pods[key] = p
+                self._account(key, p)
+            self.table.rebuild(self.nodes, self.node_load, self.app_load, self.requested)
+
+    def start(self):
+        self.node_thread = threading.Thread(target=self._watch_nodes, name="node-watch", daemon=True)
+        self.node_thread.start()
+
+    def _watch_nodes(self):
+        stream = ResumableWatch("nodos", self.api.list_node, self.node_rv, self.relist_nodes)
+        for event_type, node in stream.stream():
+            if RECORDER:
+                RECORDER.emit("node", e=event_type, o=node)
+            self.apply_node_event(event_type, node)
+
+    def relist_nodes(self):
+        node_list = list_objects(self.api.list_node)
+        with self.lock:
+            events = _diff(self.nodes, {n.metadata.name: n for n in node_list.items})
+        return events, node_list.metadata.resource_version
+
+    def relist_pods(self):
+        """ LIST de pods tras un 410 Gone. Devuelve los eventos que faltaron (ADDED,
+            MODIFIED o DELETED) comparando con la caché; no los aplica, eso lo hace quien
+            los consuma igual que si vinieran del watch.
+        """
+        pod_list = self._list_pods()
+        with self.lock:
+            events = _diff(self.pods, {pod_key(p): p for p in pod_list.items})
+        return events, pod_list.metadata.resource_version
+
+    def _list_pods(self):
+        if self.pod_field_selector:
+            return list_objects(self.api.list_pod_for_all_namespaces, field_selector=self.pod_field_selector)
+        return list_objects(self.api.list_pod_for_all_namespaces)
+
+    def add_node_listener(self, callback):
+        self.node_listeners.append(callback)
+
+    def apply_node_event(self, event_type, node):
+        if not node or not hasattr(node, "metadata"):
+            return
+        with self.lock:
+            if event_type == "DELETED":
+                old = self.nodes.pop(node.metadata.name, None)
+                NODE_FILTERS.pop(node.metadata.name, None)
+                hints = set()
+            else:
+                old = self.nodes.get(node.metadata.name)
+                self.nodes[node.metadata.name] = node
+                node_filter(node)
+                hints = node_change_hints(old, node)
+            if old is None or event_type == "DELETED" or hints:
+                self.table.rebuild(self.nodes, self.node_load, self.app_load, self.requested)
+        log.debug("[CACHE] Nodo %s: %s", event_type, node.metadata.name)
+
+        if hints:
+            for callback in self.node_listeners:
+                callback(node, hints)
+
+    def apply_pod_event(self, event_type, pod):
+        key = pod_key(pod)
+        with self.lock:
+            if event_type == "DELETED":
+                self.pods.pop(key, None)
+                self.assumed.pop(key, None)
+                freed = self._account(key, None)
+            else:
+                self.pods[key] = pod
+                freed = None
+                # Mientras el watch no traiga el nodo se mantiene la colocación supuesta
+                if key not in self.assumed or pod.spec.node_name:
+                    self.assumed.pop(key, None)
+                    freed = self._account(key, pod)
+            node = self.nodes.get(freed) if freed else None
+
+        # Un pod que termina o se borra deja sitio: los aparcados por recursos pueden caber
+        if node is not None:
+            for callback in self.node_listeners:
+                callback(node, {REASON_RESOURCES})
+
+    def assume(self, pod, node_name):
+        """ Colocación optimista: en cuanto se decide el nodo, el pod cuenta en su carga sin
+            esperar a que el watch confirme el bind. Así los pods que se programan seguidos
+            ven la carga real y no se amontonan en el mismo nodo. La suposición desaparece
+            cuando llega la confirmación, con forget() si el bind falla, o pasado ASSUME_TTL.
+        """
+        key = pod_key(pod)
+        app = pod.metadata.labels.get("app") if pod.metadata.labels else None
+        with self.lock:
+            self.assumed[key] = time.time() + ASSUME_TTL
+            self._set_accounting(key, (node_name, app, *pod_requests(pod)))
+
+    def forget(self, pod):
+        key = pod_key(pod)
+        with self.lock:
+            if self.assumed.pop(key, None) is not None:
+                self._set_accounting(key, None)
+                log.info("[CACHE] Suposición deshecha para %s", key)
+
+    def expire_assumed(self):
+        now = time.time()
+        with self.lock:
+            expired = [key for key, deadline in self.assumed.items() if deadline <= now]
+            for key in expired:
+                del self.assumed[key]
+                self._account(key, self.pods.get(key))
+        if expired:
+            log.info("[CACHE] %s suposiciones caducadas sin confirmación del watch", len(expired))
+
+    def _account(self, key, pod):
+        # Entrada (nodo, app, cpu, memoria) que le corresponde ahora al pod; None si no debe contar
+        entry = None
+        if pod is not None and pod.spec.node_name and pod.status.phase not in ("Succeeded", "Failed"):
+            app = pod.metadata.labels.get("app") if pod.metadata.labels else None
+            entry = (pod.spec.node_name, app, *pod_requests(pod))
+        return self._set_accounting(key, entry)
+
+    def _set_accounting(self, key, entry):
+        """ Cambia la entrada contabilizada del pod. Devuelve el nodo que deja libre, si deja alguno. """
+        previous = self.accounted.get(key)
+        if previous == entry:
+            return None
+
+        if previous is not None:
+            node_name, app, cpu, mem = previous
+            self.node_load[node_name] -= 1
+            req_cpu, req_mem = self.requested[node_name]
+            self.requested[node_name] = (req_cpu - cpu, req_mem - mem)
+            if app is not None:
+                self.app_load[(node_name, app)] -= 1
+                if not self.app_load[(node_name, app)]:
+                    del self.app_load[(node_name, app)]
+            del self.accounted[key]
+            self.table.add(previous, -1)
+
+        if entry is not None:
+            node_name, app, cpu, mem = entry
+            self.node_load[node_name] = self.node_load.get(node_name, 0) + 1
+            req_cpu, req_mem = self.requested.get(node_name, (0, 0))
+            self.requested[node_name] = (req_cpu + cpu, req_mem + mem)
+            if app is not None:
+                self.app_load[(node_name, app)] = self.app_load.get((node_name, app), 0) + 1
+            self.accounted[key] = entry
+            self.table.add(entry, 1)
+
+        if previous is not None and (entry is None or entry[0] != previous[0]):
+            return previous[0]
+        return None
+
+    def load(self, node_name, app=None):
+        if not app:
+            return self.node_load.get(node_name, 0)
+        return self.app_load.get((node_name, app), 0)
+
+    def node_view(self, pod):
+        signature = toleration_signature(pod)
+        app = pod.metadata.labels.get("app") if pod.metadata.labels else None
+        with self.lock:
+            table = self.table
+            app_load = None
+            if app:
+                app_load = table.app_load.get(app)
+                app_load = app_load.copy() if app_load is not None else np.zeros(len(table.names), dtype=np.int64)
+            return NodeView(table.names, table.mask(self.nodes, signature), table.load.copy(), app_load,
+                            table.allocatable, table.requested.copy(), np.array(pod_requests(pod), dtype=np.int64))
+
+    def get_pod(self, key):
+        with self.lock:
+            return self.pods.get(key)
+
+    def size_metric(self):
+        with self.lock:
+            return {("nodes",): len(self.nodes), ("pods",): len(self.pods), ("assumed",): len(self.assumed)}
+
+    def list_nodes(self):
+        with self.lock:
+            return list(self.nodes.values())
+
+    def list_pods(self):
+        with self.lock:
+            return list(self.pods.values())
+
+# -------------------------
+# Plugins de planificación
+# -------------------------
+# Cada plugin implementa uno o varios puntos de extensión:
+#   filter(pod, view, idx)        -> array bool sobre los candidatos idx (índices de view.names)
+#   score(pod, view, idx)         -> array float sobre los candidatos, mayor es mejor
+#   normalize(scores)             -> scores en [0, 100]; por defecto min-max
+#   bind(api, pod, node, attempt) -> resultado BIND_*, o None para pasar al siguiente binder
+# Todo se hace con operaciones de NumPy sobre los arrays de la NodeView, sin bucles por nodo.
+PLUGINS = {}
+DEFAULT_PLUGINS = "NodeCompatibility,NodeResourcesFit,LeastPods,DefaultBinder"
+# --strategy: atajos para el score; los filtros y el binder son los de siempre
+STRATEGIES = {
+    "pods": DEFAULT_PLUGINS,
+    "least-allocated": "NodeCompatibility,NodeResourcesFit,LeastAllocated,LeastPods=0.1,DefaultBinder",
+    "most-allocated": "NodeCompatibility,NodeResourcesFit,MostAllocated,DefaultBinder",
+    "balanced": "NodeCompatibility,NodeResourcesFit,BalancedAllocation,LeastAllocated,DefaultBinder",
+}
+
+
+def register_plugin(cls):
+    PLUGINS[cls.name] = cls
+    return cls
+
+
+class Plugin:
+    name = None
+    reason = None       # motivo de rechazo cuando este filtro deja al pod sin nodos
+
+    def filter(self, pod, view, idx):
+        return None
+
+    def score(self, pod, view, idx):
+        return None
+
+    def normalize(self, scores):
+        low, high = scores.min(), scores.max()
+        if high == low:
+            return np.zeros(len(scores))
+        return (scores - low) * (100.0 / (high - low))
+
+    def bind(self, api, pod, node, attempt):
         return None
 
-    pods = api.list_pod_for_all_namespaces().items
-    node_load = {n.metadata.name: 0 for n in nodes}
+    def reasons(self, cache, pod):
+        return {self.reason}
+
+
+def implements(plugin, point):
+    return getattr(type(plugin), point) is not getattr(Plugin, point)
+
+
+@register_plugin
+class NodeCompatibility(Plugin):
+    """ El filtrado de siempre: env=prod y taints tolerados (máscara memoizada en la caché). """
+    name = "NodeCompatibility"
+
+    def filter(self, pod, view, idx):
+        return view.compatible[idx]
+
+    def reasons(self, cache, pod):
+        return unschedulable_reasons(cache.list_nodes(), pod)
 
-    pod_app_label = pod.metadata.labels.get("app") if pod.metadata.labels else None
 
-    for p in pods:
-        if p.spec.node_name in node_load:
-            if not pod_app_label or (p.metadata.labels and p.metadata.labels.get("app") == pod_app_label):
-                node_load[p.spec.node_name] += 1
-                print(f"[DEBUG] Nodo {p.spec.node_name} carga={node_load[p.spec.node_name]}")
+@register_plugin
+class LeastPods(Plugin):
+    """ La política de siempre: menos pods de la misma app (o en total, si no tiene app). """
+    name = "LeastPods"
 
-    node = min(node_load, key=node_load.get)
-    print(f"[POLICY] Nodo elegido: {node} (carga={node_load[node]})")
-    print(f"[LIST-OP] Nodo {node} tiene {node_load[node]} pods activos")
-    return node
+    def score(self, pod, view, idx):
+        loads = view.app_load if view.app_load is not None else view.load
+        return -loads[idx]
+
+
+@register_plugin
+class NodeResourcesFit(Plugin):
+    """ Descarta los nodos en los que el pod no cabe: cpu y memoria pedidas más las del pod
+        por encima del allocatable, o sin hueco en el número de pods. Evita los rechazos
+        OutOfcpu/OutOfmemory del kubelet.
+    """
+    name = "NodeResourcesFit"
+    reason = REASON_RESOURCES
+
+    def filter(self, pod, view, idx):
+        allocatable, requested = view.allocatable, view.requested
+        cpu, mem = view.request
+        fits = (requested[0] + cpu <= allocatable[0]) & (requested[1] + mem <= allocatable[1])
+        return (fits & (view.load < allocatable[2]))[idx]
+
+
+def allocation(view, idx):
+    """ Fracción de cpu y memoria ocupada en cada candidato si se coloca el pod, (2, n). """
+    allocatable = np.maximum(view.allocatable[:2, idx], 1)
+    return (view.requested[:, idx] + view.request[:, None]) / allocatable
+
+
+@register_plugin
+class LeastAllocated(Plugin):
+    """ Reparte: prefiere los nodos con más cpu y memoria libres. """
+    name = "LeastAllocated"
+
+    def score(self, pod, view, idx):
+        return (1.0 - allocation(view, idx)).mean(axis=0)
+
+
+@register_plugin
+class MostAllocated(Plugin):
+    """ Empaqueta: prefiere los nodos más llenos para dejar otros vacíos. """
+    name = "MostAllocated"
+
+    def score(self, pod, view, idx):
+        return allocation(view, idx).mean(axis=0)
+
+
+@register_plugin
+class BalancedAllocation(Plugin):
+    """ Prefiere los nodos en los que cpu y memoria quedan ocupadas en la misma proporción,
+        para que no se agote una dejando la otra sin usar.
+    """
+    name = "BalancedAllocation"
+
+    def score(self, pod, view, idx):
+        return 1.0 - allocation(view, idx).std(axis=0)
+
+
+@register_plugin
+class DefaultBinder(Plugin):
+    name = "DefaultBinder"
+
+    def bind(self, api, pod, node, attempt):
+        return bind_pod(api, pod, node, attempt)
+
+
+class Profile:
+    """ Pipeline de plugins: filtros en orden, suma ponderada de los scores normalizados y
+        el primer binder que devuelva resultado. Cada llamada se mide en
+        scheduler_plugin_duration_seconds{point, plugin}.
+    """
+    def __init__(self, plugins):
+        self.plugins = plugins      # [(plugin, peso)]
+        self.filters = [p for p, _ in plugins if implements(p, "filter")]
+        self.scorers = [(p, w) for p, w in plugins if implements(p, "score") and w]
+        self.binders = [p for p, _ in plugins if implements(p, "bind")]
+        # assign_batch implementa exactamente NodeCompatibility (+ NodeResourcesFit) + LeastPods
+        # con un heap; con NodeResourcesFit descuenta los recursos de cada colocación del lote
+        filters = [p.name for p in self.filters]
+        self.batchable = (filters in (["NodeCompatibility"], ["NodeCompatibility", "NodeResourcesFit"]) and
+                          [p.name for p, _ in self.scorers] == ["LeastPods"])
+        self.batch_fit = "NodeResourcesFit" in filters
+
+    @classmethod
+    def parse(cls, spec):
+        """ "Plugin1,Plugin2=peso,..." -> Profile. El peso por defecto es 1. """
+        plugins = []
+        for item in spec.split(","):
+            name, _, weight = item.strip().partition("=")
+            if name not in PLUGINS:
+                raise ValueError(f"plugin desconocido {name!r} (disponibles: {', '.join(sorted(PLUGINS))})")
+            plugins.append((PLUGINS[name](), float(weight) if weight else 1.0))
+        profile = cls(plugins)
+        # Sin binder cada pod acabaría en BIND_FAILED y daría vueltas por el backoff para siempre
+        if not profile.binders:
+            raise ValueError(f"el perfil {spec!r} no tiene plugin de bind (p. ej. DefaultBinder)")
+        if not profile.filters and not profile.scorers:
+            raise ValueError(f"el perfil {spec!r} no tiene plugins de filter ni de score")
+        return profile
+
+    def describe(self):
+        return ", ".join(f"{p.name}={w:g}" if implements(p, "score") else p.name for p, w in self.plugins)
+
+    def select(self, cache, pod):
+        """ Devuelve (nodo, motivos de rechazo, score). """
+        view = cache.node_view(pod)
+        if not view.names:
+            return None, {REASON_NO_NODES}, None
+
+        idx = np.arange(len(view.names))
+        rejecting = []      # filtros que han descartado algún nodo
+        for plugin in self.filters:
+            start = time.perf_counter()
+            mask = plugin.filter(pod, view, idx)
+            PLUGIN_DURATION.observe(time.perf_counter() - start, point="filter", plugin=plugin.name)
+            if mask is not None:
+                candidates = len(idx)
+                idx = idx[mask]
+                if len(idx) < candidates:
+                    rejecting.append(plugin)
+            if not len(idx):
+                # Los motivos de todos los filtros que han descartado nodos, no sólo del último:
+                # si no, quitar el taint de un nodo grande no reactivaría un pod aparcado por
+                # recursos en los nodos pequeños
+                return None, set().union(*(p.reasons(cache, pod) for p in rejecting)), None
+
+        total = np.zeros(len(idx))
+        for plugin, weight in self.scorers:
+            start = time.perf_counter()
+            scores = plugin.normalize(np.asarray(plugin.score(pod, view, idx), dtype=float))
+            PLUGIN_DURATION.observe(time.perf_counter() - start, point="score", plugin=plugin.name)
+            total += weight * scores
+
+        best = int(np.argmax(total))
+        return view.names[idx[best]], None, float(total[best])
+
+    def bind(self, api, pod, node, attempt=1):
+        for plugin in self.binders:
+            start = time.perf_counter()
+            result = plugin.bind(api, pod, node, attempt)
+            PLUGIN_DURATION.observe(time.perf_counter() - start, point="bind", plugin=plugin.name)
+            if result is not None:
+                return result
+        log.error("[ERROR] Ningún plugin de bind ha tratado %s", pod_key(pod))
+        return BIND_FAILED
+
+
+PROFILE = Profile.parse(DEFAULT_PLUGINS)
+
+# -------------------------
+# Selección de nodo
+# -------------------------
+def choose_node(cache, pod):
+    """ Devuelve (nodo, motivos): el nodo elegido por los plugins de PROFILE o None y los
+        motivos por los que no cabe en ninguno.
+    """
+    log.debug("[DEBUG] Seleccionando nodo para pod %s", pod.metadata.name)
+
+    node, reasons, score = PROFILE.select(cache, pod)
+    if node is None:
+        return None, reasons
+
+    app = pod.metadata.labels.get("app") if pod.metadata.labels else None
+    load = cache.load(node, app)
+    log.info("[POLICY] Nodo elegido: %s (carga=%s, score=%.1f)", node, load, score)
+    log.debug("[LIST-OP] Nodo %s tiene %s pods activos", node, load)
+    return node, None
+
+def place_fitting(heap, free, cpu, mem):
+    """ Coloca un pod en el nodo de menos carga del heap en el que cabe y le suma uno.
+        Devuelve (carga, nodo), o None si no cabe en ninguno. free se actualiza.
+    """
+    skipped = []
+    placed = None
+    while heap:
+        load, node = heap[0]
+        room = free[node]
+        if room[2] <= 0:
+            heapq.heappop(heap)     # sin hueco de pods ya no cabe ningún pod del grupo
+        elif room[0] < cpu or room[1] < mem:
+            skipped.append(heapq.heappop(heap))
+        else:
+            heapq.heapreplace(heap, (load + 1, node))
+            room[0] -= cpu
+            room[1] -= mem
+            room[2] -= 1
+            placed = load, node
+            break
+    # Un pod más pequeño del mismo grupo aún puede caber en los nodos saltados
+    for item in skipped:
+        heapq.heappush(heap, item)
+    return placed
+
+
+def assign_batch(cache, pods, fit=False):
+    """ Asignación conjunta de un lote: los pods se agrupan por (firma de tolerations,
+        app), que determinan los nodos candidatos y la carga que cuenta, y cada grupo se
+        reparte con un min-heap de cargas que se actualiza tras cada colocación. Coste
+        O((P + N) log N) en lugar de un choose_node completo por pod. Las colocaciones del
+        propio lote se suman a la carga de la caché para los grupos siguientes.
+
+        Con fit (NodeResourcesFit en el perfil) se lleva junto al heap la cpu, memoria y
+        hueco de pods libres de cada nodo, descontando las colocaciones del lote, y se
+        saltan los nodos del tope del heap en los que el pod no cabe.
+    """
+    groups = {}
+    for pod in pods:
+        app = pod.metadata.labels.get("app") if pod.metadata.labels else None
+        groups.setdefault((toleration_signature(pod), app or None), []).append(pod)
+
+    all_nodes = cache.list_nodes()
+    batch_total = {}   # nodo -> pods colocados en este lote
+    batch_app = {}     # (nodo, app) -> pods colocados en este lote
+    assignments = []
+
+    free = {}          # nodo -> [cpu, memoria, pods] libres, descontado el lote (sólo con fit)
+    if fit:
+        for node in all_nodes:
+            name = node.metadata.name
+            cpu, mem, slots = node_allocatable(node)
+            req_cpu, req_mem = cache.requested.get(name, (0, 0))
+            free[name] = [cpu - req_cpu, mem - req_mem, slots - cache.load(name)]
+
+    for (signature, app), group in groups.items():
+        names = [n.metadata.name for n in all_nodes if filter_reason(node_filter(n), signature) is None]
+        if not names:
+            reasons = unschedulable_reasons(all_nodes, group[0])
+            assignments.extend((pod, None, reasons) for pod in group)
+            continue
+
+        if app:
+            heap = [(cache.load(n, app) + batch_app.get((n, app), 0), n) for n in names]
+        else:
+            heap = [(cache.load(n) + batch_total.get(n, 0), n) for n in names]
+        heapq.heapify(heap)
+
+        for pod in group:
+            if fit:
+                placed = place_fitting(heap, free, *pod_requests(pod))
+            else:
+                placed = heap[0]
+                heapq.heapreplace(heap, (placed[0] + 1, placed[1]))
+            if placed is None:
+                # Como en Profile.select: también cuentan los nodos que descartó el filtrado
+                reasons = {REASON_RESOURCES} | unschedulable_reasons(all_nodes, pod)
+                assignments.append((pod, None, reasons))
+                continue
+
+            load, node = placed
+            batch_total[node] = batch_total.get(node, 0) + 1
+            if app:
+                batch_app[(node, app)] = batch_app.get((node, app), 0) + 1
+            log.debug("[POLICY] Nodo elegido: %s (carga=%s) para %s/%s [lote]",
+                      node, load, pod.metadata.namespace, pod.metadata.name)
+            assignments.append((pod, node, None))
+
+    log.info("[BATCH] %s pods, %s grupos, %s nodos", len(pods), len(groups), len(all_nodes))
+    return assignments
 
 # -------------------------
 # Bind del pod
 # -------------------------
-def bind_pod(api, pod, node_name, retries=3, delay=2):
+BIND_OK = "ok"
+BIND_CONFLICT = "conflict"   # 409: el pod ya tiene nodo, no tiene sentido reintentar
+BIND_RETRY = "retry"         # 429, 5xx o error de red: se reintenta con backoff
+BIND_FAILED = "failed"       # resto de errores (404, 403...): se abandona
+
+BIND_MAX_ATTEMPTS = 5
+BIND_BACKOFF_BASE = 0.5      # segundos
+BIND_BACKOFF_MAX = 10.0      # segundos
+
+
+def bind_backoff(attempt):
+    """ Espera antes del intento attempt+1: exponencial con tope y jitter (entre la
+        mitad y el total) para que los reintentos de una ráfaga no lleguen juntos.
+    """
+    delay = min(BIND_BACKOFF_MAX, BIND_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def binding_body(pod, node_name):
+    target = client.V1ObjectReference(kind="Node", name=node_name)
+    meta = client.V1ObjectMeta(name=pod.metadata.name)
+    return client.V1Binding(target=target, metadata=meta)
+
+
+def bind_pod(api, pod, node_name, attempt=1):
+    """ Un único intento de bind. No duerme nunca: el reintento lo programa quien llama
+        (BindRetryQueue en el motor síncrono, una tarea en el motor asyncio).
+    """
     key = f"{pod.metadata.namespace}/{pod.metadata.name}"
 
-    if key not in EVENTS:
-        EVENTS[key] = {"added": None, "scheduled": None, "bound": None, "started": None, "bind_attempts": 0}
+    record = TRACES.get(pod)
+    record.bind_attempts = attempt
+    record.bind_retries = attempt - 1
+    log.debug("[SCHED] Intento bind %s: %s -> %s", attempt, key, node_name)
 
-    for attempt in range(1, retries + 1):
-        EVENTS[key]["bind_attempts"] = attempt
-        print(f"[SCHED] Intento bind {attempt}: {key} -> {node_name}")
+    BIND_ATTEMPTS.inc()
+    API_REQUESTS.inc(verb="create", resource="bindings")
+    start = time.perf_counter()
+    try:
+        body = binding_body(pod, node_name)
+        api.create_namespaced_binding(pod.metadata.namespace, body, _preload_content=False)
+        log.info("[INFO] Bind correcto: %s -> %s", key, node_name)
+        result = BIND_OK
+        status = 201
+
+    except client.rest.ApiException as e:
+        log.error("[ERROR] Fallo bind %s: %s %s", key, e.status, e.reason)
+        status = e.status or 0
+        if e.status == 409:
+            result = BIND_CONFLICT
+        elif e.status == 429 or (e.status or 0) >= 500:
+            result = BIND_RETRY
+        else:
+            result = BIND_FAILED
 
-        try:
-            target = client.V1ObjectReference(kind="Node", name=node_name)
-            meta = client.V1ObjectMeta(name=pod.metadata.name)
-            body = client.V1Binding(target=target, metadata=meta)
+    except Exception as e:
+        log.error("[ERROR] Fallo bind %s: %s", key, e)
+        result = BIND_RETRY
+        status = 0
+
+    elapsed = time.perf_counter() - start
+    PHASE_LATENCY.observe(elapsed, phase="bind")
+    if RECORDER:
+        RECORDER.emit("bind", pod=key, node=node_name, a=attempt, s=status, d=round(elapsed, 6))
+    if result != BIND_OK:
+        BIND_FAILURES.inc(result=result)
+    return result
+
+
+def bind_should_retry(pod, result, attempt):
+    if result != BIND_RETRY:
+        return False
+    if attempt >= BIND_MAX_ATTEMPTS:
+        log.error("[ERROR] No se pudo bindear %s después de %s intentos", pod.metadata.name, attempt)
+        return False
+    return True
 
-            api.create_namespaced_binding(pod.metadata.namespace, body, _preload_content=False)
-            print(f"[INFO] Bind correcto: {key} -> {node_name}")
+
+class BindRetryQueue:
+    """ Cola de reintentos de bind del motor síncrono. Los binds fallidos se guardan en un
+        heap ordenado por instante de reintento y un hilo propio los vuelve a lanzar, así
+        el bucle del watch sigue programando pods mientras tanto.
+    """
+
+    def __init__(self, api, cache, queue):
+        self.api = api
+        self.cache = cache
+        self.queue = queue
+        self.heap = []
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="bind-retry", daemon=True)
+        self.thread.start()
+
+    def push(self, pod, node_name, attempt):
+        delay = bind_backoff(attempt)
+        log.info("[RETRY] %s: reintento %s en %.2fs", pod_key(pod), attempt + 1, delay)
+        with self.cond:
+            self.seq += 1
+            heapq.heappush(self.heap, (time.time() + delay, self.seq, pod, node_name, attempt + 1))
+            self.cond.notify()
+
+    def __len__(self):
+        with self.cond:
+            return len(self.heap)
+
+    def _run(self):
+        while running:
+            with self.cond:
+                if not self.heap:
+                    self.cond.wait(timeout=1)
+                    continue
+                wait = self.heap[0][0] - time.time()
+                if wait > 0:
+                    self.cond.wait(timeout=min(wait, 1))
+                    continue
+                _, _, pod, node_name, attempt = heapq.heappop(self.heap)
+
+            result = PROFILE.bind(self.api, pod, node_name, attempt)
+            if bind_should_retry(pod, result, attempt):
+                self.push(pod, node_name, attempt)
+            else:
+                finish_bind(self.cache, self.queue, pod, node_name, result)
+
+# -------------------------
+# Cola de planificación
+# -------------------------
+POD_BACKOFF_BASE = 1.0       # segundos
+POD_BACKOFF_MAX = 10.0       # segundos
+
+
+def pod_priority(pod):
+    return pod.spec.priority or 0
+
+
+class SchedulingQueue:
+    """ Cola de planificación con tres sub-colas, indexadas por UID del pod:
+
+        - active: pods listos para programar, por prioridad (mayor primero) y después
+          por orden de llegada.
+        - backoff: pods cuyo intento falló; vuelven a active tras un backoff exponencial.
+        - unschedulable: pods sin nodo compatible; vuelven a active pasado REJECTION_TIMEOUT.
+          Es el registro de rechazos: no hace falta escribir nada en el API server.
+          Además, on_node_change los reactiva en cuanto un nodo añadido o modificado
+          resuelve el motivo por el que fallaron.
+
+        Un pod sólo puede estar una vez en la cola (o en vuelo en un worker): los MODIFIED
+        repetidos sólo actualizan el objeto guardado, así que no hay trabajo duplicado y la
+        memoria queda acotada por el número de pods pendientes.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.active_heap = []       # (-prioridad, llegada, seq, uid)
+        self.active = {}            # uid -> pod
+        self.backoff_heap = []      # (instante de salida, seq, uid)
+        self.backoff = {}           # uid -> pod
+        self.unschedulable = {}     # uid -> (pod, instante de rechazo, motivos)
+        self.inflight = {}          # uid -> pod que está procesando un worker
+        self.cancelled = set()      # pods borrados o asignados mientras estaban en vuelo
+        self.arrival = {}           # uid -> instante de llegada (se mantiene entre reintentos)
+        self.failures = {}          # uid -> fallos seguidos, para el backoff
+        self.seq = 0
+        self.last_unschedulable_flush = 0.0
+
+    def add(self, pod, rejected_at=None):
+        """ Encola un pod pendiente. Devuelve True si es nuevo en la cola. Con rejected_at
+            (rechazo persistido en la anotación, p.ej. antes de un reinicio) entra aparcado
+            en unschedulable como si se hubiera rechazado en ese instante; al no conocerse
+            el motivo, cualquier cambio de nodo que lo haga compatible lo reactiva.
+        """
+        uid = pod.metadata.uid
+        with self.cond:
+            if uid in self.inflight:
+                return False
+            if uid in self.active:
+                self.active[uid] = pod
+                return False
+            if uid in self.backoff:
+                self.backoff[uid] = pod
+                return False
+            if uid in self.unschedulable:
+                _, ts, reasons = self.unschedulable[uid]
+                self.unschedulable[uid] = (pod, ts, reasons)
+                return False
+
+            self.arrival[uid] = time.time()
+            if rejected_at is not None:
+                self.unschedulable[uid] = (pod, rejected_at, ALL_REASONS)
+                return True
+            self._push_active(uid, pod)
+            self.cond.notify()
+            return True
+
+    def delete(self, pod):
+        uid = pod.metadata.uid
+        with self.cond:
+            self.active.pop(uid, None)
+            self.backoff.pop(uid, None)
+            self.unschedulable.pop(uid, None)
+            self.arrival.pop(uid, None)
+            self.failures.pop(uid, None)
+            if uid in self.inflight:
+                self.cancelled.add(uid)
+            # Las entradas de los heaps se descartan al salir; se compactan si crecen
+            if len(self.active_heap) > 2 * len(self.active) + 64:
+                self.active_heap = [e for e in self.active_heap if e[3] in self.active]
+                heapq.heapify(self.active_heap)
+
+    def pop(self, timeout=1.0):
+        """ Saca el siguiente pod de active (esperando como mucho timeout segundos) y lo
+            marca en vuelo. Hay que cerrarlo con done(), backoff_pod() o park().
+        """
+        deadline = time.time() + timeout
+        with self.cond:
+            while True:
+                now = time.time()
+                self._flush(now)
+                while self.active_heap:
+                    uid = heapq.heappop(self.active_heap)[3]
+                    pod = self.active.pop(uid, None)
+                    if pod is None:
+                        continue
+                    self.inflight[uid] = pod
+                    PHASE_LATENCY.observe(now - self.arrival.get(uid, now), phase="queue")
+                    return pod
+
+                remaining = deadline - now
+                if remaining <= 0 or not running:
+                    return None
+                wait = min(remaining, 1.0)
+                if self.backoff_heap:
+                    wait = min(wait, max(self.backoff_heap[0][0] - now, 0.0))
+                self.cond.wait(timeout=wait)
+
+    def pop_batch(self, max_pods, window, timeout=1.0):
+        """ Espera al primer pod y después sigue sacando durante window segundos o hasta
+            max_pods. Con max_pods <= 1 equivale a pop().
+        """
+        pod = self.pop(timeout)
+        if pod is None:
+            return []
+        batch = [pod]
+        deadline = time.time() + window
+        while len(batch) < max_pods:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            pod = self.pop(remaining)
+            if pod is None:
+                break
+            batch.append(pod)
+        return batch
+
+    def done(self, pod):
+        uid = pod.metadata.uid
+        with self.cond:
+            self.inflight.pop(uid, None)
+            self.cancelled.discard(uid)
+            self.arrival.pop(uid, None)
+            self.failures.pop(uid, None)
+
+    def backoff_pod(self, pod):
+        uid = pod.metadata.uid
+        with self.cond:
+            if self._finish_inflight(uid):
+                return
+            failures = self.failures.get(uid, 0) + 1
+            self.failures[uid] = failures
+            delay = min(POD_BACKOFF_MAX, POD_BACKOFF_BASE * 2 ** (failures - 1))
+            self.seq += 1
+            self.backoff[uid] = pod
+            heapq.heappush(self.backoff_heap, (time.time() + delay, self.seq, uid))
+            self.cond.notify()
+        log.info("[QUEUE] %s a backoff %.1fs (fallos=%s)", pod_key(pod), delay, failures)
+
+    def park(self, pod, reasons):
+        uid = pod.metadata.uid
+        with self.cond:
+            if self._finish_inflight(uid):
+                return
+            self.unschedulable[uid] = (pod, time.time(), frozenset(reasons))
+        REJECTIONS.inc()
+        log.info("[QUEUE] %s aparcado como no programable (%s)", pod_key(pod), ', '.join(sorted(reasons)))
+
+    def on_node_change(self, node, hints):
+        """ Reactiva los pods aparcados que el cambio del nodo puede desbloquear: sólo los
+            que fallaron por un motivo afectado y para los que el nodo ya es compatible.
+        """
+        with self.cond:
+            ready = [uid for uid, (pod, _, reasons) in self.unschedulable.items()
+                     if reasons & hints and is_node_compatible(node, pod)]
+            for uid in ready:
+                pod, _, _ = self.unschedulable.pop(uid)
+                self._push_active(uid, pod)
+            if ready:
+                self.cond.notify_all()
+        if ready:
+            log.info("[QUEUE] Nodo %s (%s): %s pods reactivados", node.metadata.name, ', '.join(sorted(hints)), len(ready))
+
+    def stats(self):
+        with self.cond:
+            return {"active": len(self.active), "backoff": len(self.backoff),
+                    "unschedulable": len(self.unschedulable), "inflight": len(self.inflight)}
+
+    def depth_metric(self):
+        return {(name,): value for name, value in self.stats().items()}
+
+    def _finish_inflight(self, uid):
+        # True si el pod se borró o asignó mientras estaba en vuelo (o ya no lo estaba) y no
+        # hay que volver a encolarlo
+        if self.inflight.pop(uid, None) is None:
+            return True
+        if uid in self.cancelled:
+            self.cancelled.discard(uid)
             return True
+        return False
+
+    def _push_active(self, uid, pod):
+        self.seq += 1
+        self.active[uid] = pod
+        heapq.heappush(self.active_heap, (-pod_priority(pod), self.arrival.get(uid, 0.0), self.seq, uid))
+
+    def _flush(self, now):
+        while self.backoff_heap and self.backoff_heap[0][0] <= now:
+            uid = heapq.heappop(self.backoff_heap)[2]
+            pod = self.backoff.pop(uid, None)
+            if pod is not None:
+                self._push_active(uid, pod)
+
+        if now - self.last_unschedulable_flush < 1.0:
+            return
+        self.last_unschedulable_flush = now
+        expired = [uid for uid, (_, ts, _) in self.unschedulable.items() if now - ts >= REJECTION_TIMEOUT]
+        for uid in expired:
+            pod, _, _ = self.unschedulable.pop(uid)
+            self._push_active(uid, pod)
+
+# -------------------------
+# Tratamiento de eventos de pods
+# -------------------------
+def observe_pod_event(cache, queue, scheduler_name, event_type, pod, update_cache=True):
+    """ Handler del watch: actualiza la caché y las trazas y sólo encola. Programar el
+        pod es cosa del worker que vacía la cola.
+    """
+    if not pod or not hasattr(pod, "spec"):
+        return
+
+    # Con el watch filtrado, el stream de pendientes no alimenta la caché: cuando un pod se
+    # asigna sale del field selector y llega como DELETED, aunque siga existiendo.
+    if update_cache:
+        cache.apply_pod_event(event_type, pod)
+
+    log.debug("[DEBUG] Evento: %s pod=%s", event_type, pod.metadata.name)
+    if event_type == "DELETED":
+        queue.delete(pod)
+        if SHARDING:
+            SHARDING.drop(pod)
+        # Sin caché (stream de pendientes filtrado) un DELETED sólo significa que ya tiene nodo
+        if update_cache:
+            TRACES.delete(pod)
+        return
+
+    if pod.spec.node_name:
+        log.debug("[DEBUG] Pod ya asignado - nodo=%s fase=%s", pod.spec.node_name, pod.status.phase)
+        if pod.status.phase == "Running":
+            record_trace(pod, "STARTED")
+        queue.delete(pod)
+        if SHARDING:
+            SHARDING.drop(pod)
+        return
+
+    if event_type not in ("ADDED", "MODIFIED"):
+        return
+
+    if pod.spec.scheduler_name != scheduler_name:
+        return
+
+    key = f"{pod.metadata.namespace}/{pod.metadata.name}"
+    if SHARDING and not SHARDING.offer(pod):
+        return
+
+    if event_type == "ADDED":
+        record_trace(pod, "CREATED")
+        log.debug("[EVENT] %s: CREATED detectado", key)
+
+    # Un rechazo reciente anotado no descarta el pod: se aparca hasta que venza
+    # REJECTION_TIMEOUT (contado desde la anotación) o un nodo lo pueda desbloquear
+    rejected_at = pod_recent_rejection(pod) if PERSIST_REJECTIONS else None
+    if queue.add(pod, rejected_at):
+        record_trace(pod, "ADDED")
+        log.debug("[EVENT] %s: ADDED detectado", key)
+        if rejected_at is not None:
+            log.info("[QUEUE] %s aparcado por rechazo reciente (hace %.0fs)", key, time.time() - rejected_at)
+
+
+def pick_nodes(api, cache, queue, pods):
+    """ Primera parte del trabajo del worker: elegir nodo para uno o varios pods. Devuelve
+        [(pod, nodo)] con los que hay que bindear; los que ya no hay que programar se
+        cierran y los que no caben en ningún nodo quedan aparcados.
+    """
+    start = time.perf_counter()
+    cache.expire_assumed()
+    if SHARDING:
+        pods = SHARDING.claim(queue, pods)
+    pending = []
+    for pod in pods:
+        key = pod_key(pod)
+        log.info("Attempting to schedule pod: %s", key)
+        cached = cache.get_pod(key)
+        if cached is not None and cached.spec.node_name:
+            log.info("[INFO] Pod %s ya asignado a %s, se descarta", key, cached.spec.node_name)
+            queue.done(pod)
+            continue
+
+        log.debug("[SCHED] Procesando pod %s", key)
+        log.debug("[DEBUG] schedulerName=%s", pod.spec.scheduler_name)
+        log.debug("[DEBUG] phase=%s", pod.status.phase)
+        log.debug("[DEBUG] anotaciones=%s", pod.metadata.annotations)
+        pending.append(pod)
+
+    if len(pending) > 1 and PROFILE.batchable:
+        assignments = assign_batch(cache, pending, fit=PROFILE.batch_fit)
+    else:
+        # Generador: cada pod se evalúa después del assume del anterior, así que los
+        # plugins ya ven la carga de las colocaciones previas del mismo lote
+        assignments = ((pod, *choose_node(cache, pod)) for pod in pending)
+
+    selected = []
+    for pod, node, reasons in assignments:
+        key = pod_key(pod)
+        if not node:
+            log.info("[INFO] No hay nodos compatibles, marcando rechazo")
+            queue.park(pod, reasons)
+            if PERSIST_REJECTIONS:
+                mark_pod_rejected(api, pod)
+            log.info("[INFO] Pod %s rechazado temporalmente", key)
+            continue
+
+        cache.assume(pod, node)
+        record_trace(pod, "SCHEDULED", node=node)
+        ts_iso = datetime.datetime.utcnow().isoformat()
+        log.info("[BIND-TIME] %s %s", key, ts_iso)
+        selected.append((pod, node))
+
+    if pending:
+        per_pod = (time.perf_counter() - start) / len(pending)
+        for _ in pending:
+            PHASE_LATENCY.observe(per_pod, phase="decide")
+    return selected
+
+
+def report_bind(pod, node, result):
+    key = pod_key(pod)
+    if result == BIND_OK:
+        record_trace(pod, "BOUND", node=node)
+        log.info("[INFO] Binding Pod %s asignado a %s", key, node)
+        log.info("[EVENT] Bound %s: BOUND detectado", key)
+        return
+
+    trace_bind_failure(pod, node, result)
+    if result == BIND_CONFLICT:
+        log.info("[INFO] Pod %s ya estaba asignado (409), vuelve a la cola hasta que el watch traiga su nodo", key)
+    else:
+        log.error("[ERROR] Bind falló para %s", key)
+
+
+def finish_bind(cache, queue, pod, node, result):
+    report_bind(pod, node, result)
+    if result == BIND_OK:
+        queue.done(pod)
+        return
+
+    # Un 409 (otra réplica o un líder anterior ya lo ha asignado) también vuelve a la cola:
+    # en cuanto el watch traiga el pod con nodo se saca de ella, y si no, se reintenta
+    cache.forget(pod)
+    queue.backoff_pod(pod)
+
 
+def schedule_pods(api, cache, queue, retry_queue, pods):
+    try:
+        selected = pick_nodes(api, cache, queue, pods)
+    except Exception as e:
+        log.error("[ERROR] Error procesando %s pods: %s", len(pods), e)
+        for pod in pods:
+            cache.forget(pod)
+            queue.backoff_pod(pod)
+        return
+
+    for pod, node in selected:
+        try:
+            result = PROFILE.bind(api, pod, node)
+            if bind_should_retry(pod, result, 1):
+                retry_queue.push(pod, node, 1)
+            else:
+                finish_bind(cache, queue, pod, node, result)
+        except Exception as e:
+            log.error("[ERROR] Error procesando pod %s: %s", pod_key(pod), e)
+            cache.forget(pod)
+            queue.backoff_pod(pod)
+
+# -------------------------
+# Fuentes de eventos de pods
+# -------------------------
+ASSIGNED_PODS_SELECTOR = "spec.nodeName!="
+
+
+def pending_pods_selector(scheduler_name):
+    return f"spec.schedulerName={scheduler_name},spec.nodeName="
+
+
+def all_pod_events(api, cache):
+    # Los pods que ya existían al arrancar se tratan una sola vez como ADDED; a partir de
+    # aquí el watch continúa desde el resourceVersion del LIST inicial.
+    for pod in cache.list_pods():
+        if not running:
+            return
+        yield "ADDED", pod
+
+    stream = ResumableWatch("pods", api.list_pod_for_all_namespaces, cache.pod_rv, cache.relist_pods)
+    yield from stream.stream()
+
+
+def assigned_pod_events(api, cache):
+    stream = ResumableWatch("pods asignados", api.list_pod_for_all_namespaces, cache.pod_rv,
+                            cache.relist_pods, field_selector=ASSIGNED_PODS_SELECTOR)
+    yield from stream.stream()
+
+
+def pending_pod_events(api, scheduler_name):
+    """ Watch filtrado en el servidor: sólo llegan los pods sin nodo de este scheduler.
+        Se lleva un índice propio de pendientes para poder hacer el diff tras un 410.
+    """
+    selector = pending_pods_selector(scheduler_name)
+    pending = {}
+
+    def relist():
+        pod_list = list_objects(api.list_pod_for_all_namespaces, field_selector=selector)
+        events = _diff(pending, {pod_key(p): p for p in pod_list.items})
+        return events, pod_list.metadata.resource_version
+
+    # El LIST inicial contra un índice vacío devuelve todos los pendientes como ADDED
+    events, resource_version = relist()
+    log.info("[WATCH] %s pods pendientes para %s", len(events), scheduler_name)
+    stream = ResumableWatch("pods pendientes", api.list_pod_for_all_namespaces, resource_version,
+                            relist, field_selector=selector)
+
+    for source in (events, stream.stream()):
+        for event_type, pod in source:
+            if event_type == "DELETED":
+                pending.pop(pod_key(pod), None)
+            else:
+                pending[pod_key(pod)] = pod
+            yield event_type, pod
+
+
+def pod_event_sources(api, cache, args):
+    """ Lista de (generador de eventos, update_cache) según el modo de watch. """
+    if args.filtered_watch:
+        # Los pods asignados sólo sirven para la carga por nodo y las trazas STARTED
+        return [(assigned_pod_events(api, cache), True),
+                (pending_pod_events(api, args.scheduler_name), False)]
+    return [(all_pod_events(api, cache), True)]
+
+# -------------------------
+# Elección de líder (Lease)
+# -------------------------
+LEASE_DURATION = 15.0       # segundos sin renovar antes de que otra réplica pueda quedarse el Lease
+LEASE_RETRY_PERIOD = 2.0    # cada cuánto se intenta renovar (líder) o adquirir (standby)
+# Como en client-go: el líder deja de programar si lleva LEASE_RENEW_DEADLINE sin renovar,
+# antes de que a los LEASE_DURATION otra réplica pueda quedarse el Lease
+LEASE_RENEW_DEADLINE = 10.0
+
+# Sólo el líder saca pods de la cola. Sin --leader-elect está siempre activo.
+LEADING = threading.Event()
+LEADING.set()
+
+
+def lease_now():
+    # MicroTime del API server exige los microsegundos; isoformat() los omite si valen 0
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return now.replace(microsecond=now.microsecond or 1)
+
+
+class LeaderElector:
+    """ Elección de líder sobre un Lease de coordination.k8s.io, como client-go:
+        el líder renueva spec.renewTime cada retry_period y las demás réplicas lo toman
+        cuando llevan lease_duration segundos (medidos con su propio reloj) sin ver cambios.
+        Las escrituras usan el resourceVersion leído, así que dos réplicas no pueden
+        quedarse el Lease a la vez: la segunda recibe un 409.
+
+        El líder deja de programar en cuanto lleva renew_deadline (< lease_duration) sin
+        renovar. Lo comprueba un hilo aparte, así que una petición colgada al API server no
+        lo retrasa; además cada petición lleva un timeout de renew_deadline / 2.
+
+        Las réplicas en standby siguen con los watch en marcha (caché y cola calientes);
+        sólo dejan de sacar pods de la cola mientras LEADING esté sin activar.
+    """
+    def __init__(self, api, name, namespace, identity,
+                 lease_duration=LEASE_DURATION, retry_period=LEASE_RETRY_PERIOD,
+                 renew_deadline=LEASE_RENEW_DEADLINE):
+        self.api = api
+        self.name = name
+        self.namespace = namespace
+        self.identity = identity
+        self.lease_duration = lease_duration
+        self.retry_period = retry_period
+        self.renew_deadline = renew_deadline
+        self.request_timeout = renew_deadline / 2
+        self.observed = None            # (holder, renewTime) visto por última vez
+        self.observed_at = 0.0          # time.monotonic() de cuando cambió
+        self.last_renew = 0.0           # time.monotonic() del envío de la última escritura correcta
+        self.thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self.watchdog = threading.Thread(target=self._watch_deadline, name="leader-deadline", daemon=True)
+
+    def start(self):
+        LEADING.clear()
+        self.thread.start()
+        self.watchdog.start()
+        log.info("[LEADER] Elección de líder con Lease %s/%s como %s (duración %.0fs, renovación %.0fs)",
+                 self.namespace, self.name, self.identity, self.lease_duration, self.renew_deadline)
+
+    def _run(self):
+        while running:
+            try:
+                self.try_acquire_or_renew()
+            except Exception as e:
+                log.error("[ERROR] Elección de líder: %s", e)
+            time.sleep(self.retry_period)
+
+    def _watch_deadline(self):
+        # El líder que no consigue renovar a tiempo deja de programar antes de que otra
+        # réplica pueda darlo por caducado, aunque _run siga esperando al API server
+        while running:
+            if LEADING.is_set() and not self._within_deadline():
+                self._step_down(f"{self.renew_deadline:.0f}s sin poder renovar el Lease")
+            time.sleep(min(self.retry_period, 1.0))
+
+    def _within_deadline(self):
+        return time.monotonic() - self.last_renew <= self.renew_deadline
+
+    def try_acquire_or_renew(self):
+        API_REQUESTS.inc(verb="get", resource="leases")
+        try:
+            lease = self.api.read_namespaced_lease(self.name, self.namespace,
+                                                   _request_timeout=self.request_timeout)
+        except client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+            self._create()
+            return
+
+        spec = lease.spec
+        holder = spec.holder_identity or ""
+        observed = (holder, spec.renew_time)
+        now = time.monotonic()
+        if observed != self.observed:
+            self.observed = observed
+            self.observed_at = now
+
+        if holder == self.identity:
+            spec.renew_time = lease_now()
+            # Si se dejó de programar por no poder renovar y nadie ha tomado el Lease entretanto,
+            # la renovación correcta devuelve el liderazgo; si no, se renovaría sin programar nunca
+            if self._replace(lease) and not LEADING.is_set() and self._within_deadline():
+                self._became_leader(None, 0.0)
+            return
+
+        if holder and now - self.observed_at < (spec.lease_duration_seconds or self.lease_duration):
+            if LEADING.is_set():
+                self._step_down(f"el Lease es de {holder}")
+            return
+
+        previous_renew = spec.renew_time
+        spec.holder_identity = self.identity
+        spec.lease_duration_seconds = int(self.lease_duration)
+        spec.acquire_time = spec.renew_time = lease_now()
+        spec.lease_transitions = (spec.lease_transitions or 0) + 1
+        if self._replace(lease):
+            gap = (spec.renew_time - previous_renew).total_seconds() if previous_renew else 0.0
+            self._became_leader(holder or "(liberado)", gap)
+
+    def _create(self):
+        now = lease_now()
+        body = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=self.name, namespace=self.namespace),
+            spec=client.V1LeaseSpec(holder_identity=self.identity,
+                                    lease_duration_seconds=int(self.lease_duration),
+                                    acquire_time=now, renew_time=now, lease_transitions=0))
+        API_REQUESTS.inc(verb="create", resource="leases")
+        sent = time.monotonic()
+        try:
+            self.api.create_namespaced_lease(self.namespace, body, _request_timeout=self.request_timeout)
+        except client.rest.ApiException as e:
+            if e.status == 409:
+                return      # otra réplica lo ha creado antes
+            raise
+        self.last_renew = sent
+        self._became_leader(None, 0.0)
+
+    def _replace(self, lease):
+        API_REQUESTS.inc(verb="update", resource="leases")
+        # El plazo se cuenta desde el envío: una respuesta lenta no alarga el liderazgo
+        sent = time.monotonic()
+        try:
+            self.api.replace_namespaced_lease(self.name, self.namespace, lease,
+                                              _request_timeout=self.request_timeout)
         except client.rest.ApiException as e:
-            print(f"[ERROR] Fallo bind {key}: {e}")
-            time.sleep(delay)
+            if e.status == 409:
+                log.debug("[LEADER] Conflicto escribiendo el Lease, otra réplica se ha adelantado")
+                return False
+            raise
+        self.last_renew = sent
+        return True
+
+    def _became_leader(self, previous, gap):
+        LEADER_TRANSITIONS.inc()
+        if previous:
+            FAILOVER_LATENCY.observe(gap)
+            log.info("[LEADER] %s es el nuevo líder (anterior: %s, %.2fs desde su última renovación)",
+                     self.identity, previous, gap)
+        else:
+            log.info("[LEADER] %s es el nuevo líder", self.identity)
+        LEADING.set()
+
+    def _step_down(self, reason):
+        LEADING.clear()
+        log.warning("[LEADER] %s deja de ser líder: %s", self.identity, reason)
+
+    def release(self):
+        """ Al parar, el líder vacía holderIdentity para que el standby no espere a que caduque. """
+        if not LEADING.is_set():
+            return
+        LEADING.clear()
+        try:
+            lease = self.api.read_namespaced_lease(self.name, self.namespace,
+                                                   _request_timeout=self.request_timeout)
+            if lease.spec.holder_identity != self.identity:
+                return
+            lease.spec.holder_identity = None
+            lease.spec.lease_duration_seconds = 1
+            self.api.replace_namespaced_lease(self.name, self.namespace, lease,
+                                              _request_timeout=self.request_timeout)
+            log.info("[LEADER] Lease %s/%s liberado", self.namespace, self.name)
+        except Exception as e:
+            log.error("[ERROR] No se ha podido liberar el Lease: %s", e)
+
 
-    print(f"[ERROR] No se pudo bindear {pod.metadata.name} después de {retries} intentos")
-    return False
+def leader_identity():
+    return f"{socket.gethostname()}_{uuid.uuid4().hex[:8]}"
 
 # -------------------------
-# WATCH principal
+# Reparto entre réplicas (sharding)
 # -------------------------
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--scheduler-name", default="my-scheduler")
-    parser.add_argument("--kubeconfig", default=None)
-    args = parser.parse_args()
+SHARD_LABEL = "scheduler-shard-member"
+SHARD_LEASE_GC_AFTER = 300.0   # segundos caducado tras los que se borra el Lease de una réplica muerta
 
-    api = load_client(args.kubeconfig)
-    print(f"[INFO] Scheduler iniciado: {args.scheduler_name}")
 
-    w = watch.Watch()
+def shard_owner(key, members):
+    """ Rendezvous hashing: cada clave va al miembro con mayor hash(miembro, clave). Al entrar
+        o salir una réplica sólo cambian de dueño las claves que ganaba o gana esa réplica.
+    """
+    return max(members, key=lambda m: hashlib.blake2b(f"{m}/{key}".encode(), digest_size=8).digest())
+
 
-    while running:
+class ShardMembership:
+    """ Modo activo-activo: cada réplica renueva su propio Lease (con la etiqueta SHARD_LABEL)
+        y lista los de las demás para saber qué réplicas siguen vivas. Los pods pendientes se
+        reparten con shard_owner() por namespace o por UID.
+
+        Los pods de otras réplicas se guardan en held: si su dueño cae o cambia el reparto,
+        se adoptan sin esperar a un nuevo evento. Mientras las réplicas no ven todavía la
+        misma lista de miembros dos pueden intentar el mismo pod; la segunda recibe un 409
+        y el pod vuelve a la cola hasta que el watch lo muestra asignado.
+
+        El Lease se llama como el pod (el hostname), no como la identidad, que cambia en
+        cada arranque: un contenedor reiniciado reutiliza el suyo. Los de pods que ya no
+        existen (caídos sin leave()) los borra cualquier réplica al listar, cuando llevan
+        SHARD_LEASE_GC_AFTER segundos caducados.
+    """
+    def __init__(self, api, scheduler_name, namespace, identity, key="uid",
+                 lease_duration=LEASE_DURATION, retry_period=LEASE_RETRY_PERIOD):
+        self.api = api
+        self.scheduler_name = scheduler_name
+        self.namespace = namespace
+        self.identity = identity
+        self.lease_name = f"{scheduler_name}-member-{socket.gethostname()}".replace("_", "-").lower()
+        self.key = key
+        self.lease_duration = lease_duration
+        self.retry_period = retry_period
+        self.members = (identity,)
+        self.held = {}              # uid -> pod pendiente de otra réplica
+        self.lock = threading.Lock()
+        self.queue = None
+
+    def start(self, queue):
+        # La primera lista de miembros se obtiene antes de arrancar los watch de pods: si no,
+        # la réplica se creería sola y cogería todos los pendientes al arrancar
+        self.queue = queue
+        self.refresh()
+        threading.Thread(target=self._run, name="shard-membership", daemon=True).start()
+
+    def _run(self):
+        while running:
+            time.sleep(self.retry_period)
+            try:
+                self.refresh()
+            except Exception as e:
+                log.error("[ERROR] Sharding: %s", e)
+
+    def refresh(self):
+        self._renew()
+        API_REQUESTS.inc(verb="list", resource="leases")
+        leases = self.api.list_namespaced_lease(self.namespace,
+                                                label_selector=f"{SHARD_LABEL}={self.scheduler_name}")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        members = {self.identity}
+        for lease in leases.items:
+            spec = lease.spec
+            if not spec.holder_identity or not spec.renew_time:
+                continue
+            expired = (now - spec.renew_time).total_seconds() - (spec.lease_duration_seconds or self.lease_duration)
+            if expired < 0:
+                members.add(spec.holder_identity)
+            elif expired > SHARD_LEASE_GC_AFTER and lease.metadata.name != self.lease_name:
+                self._delete_stale(lease)
+        members = tuple(sorted(members))
+        if members != self.members:
+            log.info("[SHARD] Réplicas activas: %s", ", ".join(members))
+            self.members = members
+            self._adopt()
+
+    def _renew(self):
+        body = {"spec": {"holderIdentity": self.identity, "renewTime": lease_now(),
+                         "leaseDurationSeconds": int(self.lease_duration)}}
+        API_REQUESTS.inc(verb="patch", resource="leases")
+        try:
+            self.api.patch_namespaced_lease(self.lease_name, self.namespace, body)
+            return
+        except client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+        now = lease_now()
+        lease = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=self.lease_name, namespace=self.namespace,
+                                         labels={SHARD_LABEL: self.scheduler_name}),
+            spec=client.V1LeaseSpec(holder_identity=self.identity, acquire_time=now, renew_time=now,
+                                    lease_duration_seconds=int(self.lease_duration)))
+        API_REQUESTS.inc(verb="create", resource="leases")
+        self.api.create_namespaced_lease(self.namespace, lease)
+
+    def _delete_stale(self, lease):
+        # Con precondición de resourceVersion: si la réplica ha vuelto y lo ha renovado
+        # entretanto, el borrado da 409 y el Lease se queda
+        options = client.V1DeleteOptions(
+            preconditions=client.V1Preconditions(resource_version=lease.metadata.resource_version))
+        API_REQUESTS.inc(verb="delete", resource="leases")
         try:
-            for event in w.stream(api.list_pod_for_all_namespaces, timeout_seconds=60):
-                pod = event["object"]
-                event_type = event["type"] # ADDED, MODIFIED, DELETED
+            self.api.delete_namespaced_lease(lease.metadata.name, self.namespace, body=options)
+            log.info("[SHARD] Borrado el Lease %s de %s (caducado)", lease.metadata.name, lease.spec.holder_identity)
+        except client.rest.ApiException as e:
+            if e.status not in (404, 409):    # ya borrado por otra réplica, o renovado
+                raise
 
-                if not running:
-                    break
+    def leave(self):
+        """ Borra el Lease propio para que las demás réplicas adopten sus pods ya. """
+        try:
+            self.api.delete_namespaced_lease(self.lease_name, self.namespace)
+            log.info("[SHARD] %s sale del reparto", self.identity)
+        except Exception as e:
+            log.error("[ERROR] No se ha podido borrar el Lease %s: %s", self.lease_name, e)
 
-                if not pod or not hasattr(pod, "spec"):
-                    continue
+    def owns(self, pod):
+        key = pod.metadata.namespace if self.key == "namespace" else pod.metadata.uid
+        return shard_owner(key, self.members) == self.identity
 
-                print(f"[DEBUG] Evento: {event_type} pod={pod.metadata.name}")
-                print(f"Attempting to schedule pod: {pod.metadata.namespace}/{pod.metadata.name}")
-                if pod.spec.node_name:
-                    print(f"[INFO] Pod ya asignado - nodo={pod.spec.node_name} fase={pod.status.phase}")
-                    if pod.status.phase == "Running":
-                        record_trace(pod, "STARTED")
-                    continue
+    def offer(self, pod):
+        """ True si el pod es de esta réplica; si no, se guarda por si hay que adoptarlo. """
+        if self.owns(pod):
+            return True
+        with self.lock:
+            self.held[pod.metadata.uid] = pod
+        return False
 
-                if event_type in ("ADDED", "MODIFIED"):
-                    if pod_recently_rejected(pod):
-                        continue
-                    key = f"{pod.metadata.namespace}/{pod.metadata.name}"
-                    
-                    if event_type == "ADDED":
-                        record_trace(pod, "CREATED")
-                        print(f"[EVENT] {key}: CREATED detectado")
-                    elif event_type == "MODIFIED":
-                        if pod.status.phase == "Running":
-                            record_trace(pod, "STARTED")
-
-                    if pod.status.phase == "Pending" and pod.spec.scheduler_name == args.scheduler_name and not pod.spec.node_name:
-                        record_trace(pod, "ADDED")
-                        print(f"[EVENT] {key}: ADDED detectado")
-
-                    print(f"[SCHED] Procesando pod {pod.metadata.namespace}/{pod.metadata.name}")
-                    print(f"[DEBUG] schedulerName={pod.spec.scheduler_name}")
-                    print(f"[DEBUG] phase={pod.status.phase}")
-                    print(f"[DEBUG] anotaciones={pod.metadata.annotations}")
-
-                    if pod_recently_rejected(pod):
-                        print(f"[INFO] Pod {pod.metadata.name} saltado (rechazo reciente)")
-                        continue
+    def drop(self, pod):
+        with self.lock:
+            self.held.pop(pod.metadata.uid, None)
+
+    def claim(self, queue, pods):
+        """ Filtra los pods que acaban de salir de la cola: los que han pasado a otra réplica
+            desde que se encolaron se cierran y quedan en held.
+        """
+        owned = []
+        for pod in pods:
+            if self.offer(pod):
+                owned.append(pod)
+            else:
+                queue.done(pod)
+                log.debug("[SHARD] %s ya no es de esta réplica", pod_key(pod))
+        return owned
+
+    def _adopt(self):
+        with self.lock:
+            adopted = [pod for pod in self.held.values() if self.owns(pod)]
+            for pod in adopted:
+                del self.held[pod.metadata.uid]
+        for pod in adopted:
+            if self.queue.add(pod):
+                record_trace(pod, "ADDED")
+        if adopted:
+            log.info("[SHARD] %s pods adoptados tras el cambio de réplicas", len(adopted))
+
+    def metric(self):
+        with self.lock:
+            return {("members",): len(self.members), ("held",): len(self.held)}
+
+
+SHARDING = None
+
+# -------------------------
+# Motor síncrono
+# -------------------------
+def consume_pod_events(cache, queue, scheduler_name, source, update_cache):
+    for event_type, pod in source:
+        if RECORDER:
+            RECORDER.emit("pod", e=event_type, o=pod, c=update_cache)
+        try:
+            observe_pod_event(cache, queue, scheduler_name, event_type, pod, update_cache)
+        except Exception as e:
+            log.error("[ERROR] Error tratando evento %s: %s", event_type, e)
+
+
+def start_pod_watches(api, cache, queue, args):
+    # Cada stream de pods corre en su hilo y sólo encola; los workers vacían la cola
+    for source, update_cache in pod_event_sources(api, cache, args):
+        threading.Thread(target=consume_pod_events,
+                         args=(cache, queue, args.scheduler_name, source, update_cache),
+                         name="pod-watch", daemon=True).start()
 
-                    node = choose_node(api, pod)
-                    if node:
-                        record_trace(pod, "SCHEDULED")
-                        ts_iso = datetime.datetime.utcnow().isoformat()
-                        print(f"[BIND-TIME] {pod.metadata.namespace}/{pod.metadata.name} {ts_iso}")
-                        if bind_pod(api, pod, node):
-                            record_trace(pod, "BOUND")
-                            print(f"[INFO] Binding Pod {key} asignado a {node}")
-                            print(f"[EVENT] Bound {key}: BOUND detectado")
-                        else:
-                            print(f"[ERROR] Bind falló para {key}")
-                    else:
-                        print("[INFO] No hay nodos compatibles, marcando rechazo")
-                        mark_pod_rejected(api, pod)
-                        print(f"[INFO] Pod {key} rechazado temporalmente")
 
+def run_sync_engine(api, cache, queue, args):
+    retry_queue = BindRetryQueue(api, cache, queue)
+    retry_queue.start()
+    BIND_PENDING.set_function(lambda: len(retry_queue))
+    start_pod_watches(api, cache, queue, args)
+
+    while running:
+        if CPU_PROFILER:
+            CPU_PROFILER.tick()
+        if not LEADING.wait(1.0):
+            continue
+        pods = queue.pop_batch(args.batch_size, args.batch_window)
+        if pods:
+            schedule_pods(api, cache, queue, retry_queue, pods)
+
+# -------------------------
+# Motor asyncio
+# -------------------------
+class AsyncEngine:
+    """ Motor asyncio: los watch (síncronos en el cliente de kubernetes) corren en hilos
+        que alimentan la SchedulingQueue; el bucle de eventos saca pods de la cola, toma
+        las decisiones y lanza los binds como tareas, con hasta max_inflight_binds
+        peticiones en vuelo a la vez. Mientras un bind espera al API server se siguen
+        procesando pods.
+    """
+
+    def __init__(self, api, cache, queue, max_inflight_binds, batch_size=1, batch_window=0.0):
+        self.api = api
+        self.cache = cache
+        self.queue = queue
+        self.max_inflight_binds = max_inflight_binds
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.tasks = set()
+        BIND_PENDING.set_function(lambda: len(self.tasks))
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.bind_slots = asyncio.Semaphore(self.max_inflight_binds)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_inflight_binds, thread_name_prefix="bind")
+
+        log.info("[ASYNC] Motor asyncio iniciado (max_inflight_binds=%s)", self.max_inflight_binds)
+        while running:
+            if CPU_PROFILER:
+                CPU_PROFILER.tick()
+            if not await self.loop.run_in_executor(None, LEADING.wait, 1.0):
+                continue
+            pods = await self.loop.run_in_executor(None, self.queue.pop_batch,
+                                                   self.batch_size, self.batch_window)
+            if not pods:
+                continue
+
+            try:
+                selected = pick_nodes(self.api, self.cache, self.queue, pods)
+            except Exception as e:
+                log.error("[ERROR] Error procesando %s pods: %s", len(pods), e)
+                for pod in pods:
+                    self.cache.forget(pod)
+                    self.queue.backoff_pod(pod)
+                continue
+
+            for pod, node in selected:
+                # Sin hueco libre se espera aquí: es la contrapresión sobre la cola
+                await self.bind_slots.acquire()
+                task = asyncio.create_task(self._bind(pod, node))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+        if self.tasks:
+            log.info("[ASYNC] Esperando %s binds en vuelo", len(self.tasks))
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    async def _bind(self, pod, node):
+        # Se entra con un hueco de bind_slots ya reservado; durante el backoff se libera
+        # para que otros pods puedan usarlo.
+        key = pod_key(pod)
+        attempt = 1
+        holding = True
+        try:
+            while True:
+                result = await self.loop.run_in_executor(self.executor, PROFILE.bind, self.api, pod, node, attempt)
+                self.bind_slots.release()
+                holding = False
+                if not bind_should_retry(pod, result, attempt):
+                    break
+
+                delay = bind_backoff(attempt)
+                log.info("[RETRY] %s: reintento %s en %.2fs", key, attempt + 1, delay)
+                await asyncio.sleep(delay)
+                await self.bind_slots.acquire()
+                holding = True
+                attempt += 1
+            finish_bind(self.cache, self.queue, pod, node, result)
         except Exception as e:
-            print(f"[ERROR] Error general en el scheduler: {e}")
+            log.error("[ERROR] Error en bind asíncrono de %s: %s", key, e)
+            self.cache.forget(pod)
+            self.queue.backoff_pod(pod)
+        finally:
+            if holding:
+                self.bind_slots.release()
+
+# -------------------------
+# Arranque
+# -------------------------
+def main():
+    global BIND_MAX_ATTEMPTS, BIND_BACKOFF_BASE, BIND_BACKOFF_MAX, REJECTION_TIMEOUT, PERSIST_REJECTIONS, ASSUME_TTL
+    global TRACE_EXPORTER, SHARDING, PROFILE, RAW_DECODE, RECORDER, CPU_PROFILER, PROFILE_SECONDS, PROFILE_MODE
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scheduler-name", default="my-scheduler")
+    parser.add_argument("--kubeconfig", default=None)
+    parser.add_argument("--filtered-watch", action="store_true",
+                        help="watch de pendientes filtrado por schedulerName/nodeName y otro para pods asignados")
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync",
+                        help="sync: un bind cada vez; async: asyncio con binds concurrentes")
+    parser.add_argument("--max-inflight-binds", type=int, default=32,
+                        help="binds simultáneos como máximo con --engine async")
+    parser.add_argument("--bind-max-attempts", type=int, default=BIND_MAX_ATTEMPTS,
+                        help="intentos de bind antes de abandonar (errores 429/5xx/red)")
+    parser.add_argument("--bind-backoff-base", type=float, default=BIND_BACKOFF_BASE,
+                        help="espera inicial entre reintentos de bind (s), se duplica en cada intento")
+    parser.add_argument("--bind-backoff-max", type=float, default=BIND_BACKOFF_MAX,
+                        help="tope de la espera entre reintentos de bind (s)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="pods que se asignan juntos como máximo (1 = sin lotes)")
+    parser.add_argument("--batch-window", type=float, default=0.05,
+                        help="segundos que se esperan para completar un lote")
+    parser.add_argument("--assume-ttl", type=float, default=ASSUME_TTL,
+                        help="segundos que una colocación supuesta cuenta en la carga sin confirmación del watch")
+    parser.add_argument("--trace-max-pods", type=int, default=TRACE_MAX_PODS,
+                        help="máximo de pods con traza en memoria (LRU)")
+    parser.add_argument("--trace-max-age", type=float, default=TRACE_MAX_AGE,
+                        help="segundos sin actividad antes de expulsar la traza de un pod")
+    parser.add_argument("--trace-export", default=None, metavar="DIR",
+                        help="directorio donde volcar las trazas en JSONL (desactivado por defecto)")
+    parser.add_argument("--trace-export-max-mb", type=float, default=64,
+                        help="MB (sin comprimir) por fichero antes de rotar")
+    parser.add_argument("--trace-export-gzip", action="store_true",
+                        help="comprime los ficheros de trazas con gzip")
+    parser.add_argument("--leader-elect", action="store_true",
+                        help="varias réplicas; sólo programa la que tiene el Lease")
+    parser.add_argument("--lease-name", default=None, help="nombre del Lease (por defecto, el del scheduler)")
+    parser.add_argument("--lease-namespace", default="kube-system")
+    parser.add_argument("--lease-duration", type=float, default=LEASE_DURATION,
+                        help="segundos sin renovar tras los que otra réplica toma el Lease")
+    parser.add_argument("--lease-renew-deadline", type=float, default=LEASE_RENEW_DEADLINE,
+                        help="segundos sin renovar tras los que el líder deja de programar "
+                             "(menor que --lease-duration)")
+    parser.add_argument("--lease-retry-period", type=float, default=LEASE_RETRY_PERIOD,
+                        help="segundos entre renovaciones / intentos de adquirir el Lease")
+    parser.add_argument("--sharding", choices=("namespace", "uid"), default=None,
+                        help="activo-activo: las réplicas se reparten los pods por namespace o por UID")
+    parser.add_argument("--plugins", default=None,
+                        help="plugins de filter/score/bind en orden, con peso opcional: Nombre[=peso],...")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="pods",
+                        help="pods: menos pods (por defecto); least-allocated: más recursos libres; "
+                             "most-allocated: empaquetar; balanced: cpu y memoria parejas")
+    parser.add_argument("--decode", choices=("raw", "typed"), default="raw",
+                        help="raw: JSON a registros ligeros (orjson si está instalado); typed: modelos V1 del cliente")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="graba los eventos de entrada y las respuestas de bind en FILE (JSONL gzip) "
+                             "para reproducirlos con benchmarking/replay.py")
+    parser.add_argument("--profile-dir", default=None, metavar="DIR",
+                        help="activa el perfilado bajo demanda (SIGUSR1 o /debug/profile) con salida en DIR")
+    parser.add_argument("--profile-port", type=int, default=0,
+                        help="puerto de POST /debug/profile, sólo en 127.0.0.1 (0 = sólo SIGUSR1)")
+    parser.add_argument("--profile-seconds", type=float, default=PROFILE_SECONDS,
+                        help="duración de las sesiones lanzadas con SIGUSR1")
+    parser.add_argument("--profile-mode", choices=PROFILE_MODES, default=PROFILE_MODE,
+                        help="sample: pilas de todos los hilos; cprofile: pstats del bucle de planificación")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="puerto del endpoint HTTP /metrics (0 = desactivado)")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--log-format", default="text", choices=("text", "json"))
+    parser.add_argument("--log-debug-rate", type=int, default=50,
+                        help="líneas DEBUG por segundo como máximo desde cada punto del código (0 = sin límite)")
+    parser.add_argument("--log-queue-size", type=int, default=10000,
+                        help="líneas pendientes de escribir antes de empezar a descartar")
+    parser.add_argument("--rejection-timeout", type=float, default=REJECTION_TIMEOUT,
+                        help="segundos que un pod sin nodo compatible queda aparcado antes de reintentar")
+    parser.add_argument("--persist-rejections", action="store_true",
+                        help="guardar además el rechazo como anotación en el pod (PATCH al API server)")
+    args = parser.parse_args()
+    if args.leader_elect and args.sharding:
+        parser.error("--leader-elect y --sharding son excluyentes")
+    if args.leader_elect and not args.lease_retry_period < args.lease_renew_deadline < args.lease_duration:
+        parser.error("hace falta --lease-retry-period < --lease-renew-deadline < --lease-duration")
+    if not 0 < args.profile_seconds <= PROFILE_MAX_SECONDS:
+        parser.error(f"--profile-seconds debe estar en (0, {PROFILE_MAX_SECONDS:g}]")
+    try:
+        PROFILE = Profile.parse(args.plugins or STRATEGIES[args.strategy])
+    except ValueError as e:
+        parser.error(str(e))
+
+    setup_logging(args.log_level, args.log_format, args.log_debug_rate, args.log_queue_size)
+
+    BIND_MAX_ATTEMPTS = args.bind_max_attempts
+    BIND_BACKOFF_BASE = args.bind_backoff_base
+    BIND_BACKOFF_MAX = args.bind_backoff_max
+    REJECTION_TIMEOUT = args.rejection_timeout
+    PERSIST_REJECTIONS = args.persist_rejections
+    ASSUME_TTL = args.assume_ttl
+    RAW_DECODE = args.decode == "raw"
+    TRACES.max_pods = args.trace_max_pods
+    TRACES.max_age = args.trace_max_age
+    TRACE_STORE.set_function(TRACES.metric)
+    if args.trace_export:
+        TRACE_EXPORTER = TraceExporter(args.trace_export, int(args.trace_export_max_mb * 1024 * 1024),
+                                       args.trace_export_gzip)
+        TRACE_EXPORTER.start()
+    if args.record:
+        RECORDER = EventRecorder(args.record)
+        RECORDER.start()
+        RECORDER.emit("meta", scheduler_name=args.scheduler_name, filtered_watch=args.filtered_watch,
+                      plugins=PROFILE.describe())
+
+    api = load_client(args.kubeconfig)
+    log.info("[INFO] Scheduler iniciado: %s (engine=%s)", args.scheduler_name, args.engine)
+    log.info("[POLICY] Plugins: %s", PROFILE.describe())
+
+    cache = ClusterCache(api, ASSIGNED_PODS_SELECTOR if args.filtered_watch else None)
+    queue = SchedulingQueue()
+    cache.add_node_listener(queue.on_node_change)
+    QUEUE_DEPTH.set_function(queue.depth_metric)
+    CACHE_SIZE.set_function(cache.size_metric)
+    if args.profile_dir:
+        PROFILE_SECONDS = args.profile_seconds
+        PROFILE_MODE = args.profile_mode
+        CPU_PROFILER = CpuProfiler(args.profile_dir)
+        signal.signal(signal.SIGUSR1, CPU_PROFILER.signal_handler)
+        if args.profile_port:
+            # Lanzar un perfil escribe en disco y carga la CPU: fuera del puerto de métricas,
+            # que escucha en todas las interfaces, y sólo por POST
+            start_http_server(args.profile_port, {"/debug/profile": CPU_PROFILER.http_route},
+                              host="127.0.0.1", methods=("POST",))
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    cache.sync()
+    cache.start()
+
+    if args.sharding:
+        SHARDING = ShardMembership(client.CoordinationV1Api(), args.scheduler_name, args.lease_namespace,
+                                   leader_identity(), args.sharding, args.lease_duration, args.lease_retry_period)
+        SHARDING.start(queue)
+        SHARD_STATUS.set_function(SHARDING.metric)
+
+    elector = None
+    if args.leader_elect:
+        elector = LeaderElector(client.CoordinationV1Api(), args.lease_name or args.scheduler_name,
+                                args.lease_namespace, leader_identity(),
+                                args.lease_duration, args.lease_retry_period, args.lease_renew_deadline)
+        elector.start()
+
+    if args.engine == "async":
+        start_pod_watches(api, cache, queue, args)
+        engine = AsyncEngine(api, cache, queue, args.max_inflight_binds, args.batch_size, args.batch_window)
+        asyncio.run(engine.run())
+    else:
+        run_sync_engine(api, cache, queue, args)
+
+    if elector:
+        elector.release()
+    if SHARDING:
+        SHARDING.leave()
 
 if __name__ == "__main__":
     main()